@@ -0,0 +1,131 @@
+"""
+Time `papyri.gen.DFSCollector` on a synthetic package with many attributes:
+modules with functions, classes and methods, plain values, and re-exports of
+all of those from the top level module, so most objects are reached through
+more than one path::
+
+    $ python benchmarks/bench_collector.py [number of attributes]
+
+With ``--reference N``, also run the previous, quadratic, collector on a
+package with N attributes and check both find the same objects and aliases.
+"""
+
+import argparse
+import sys
+import time
+from types import FunctionType, ModuleType
+
+from papyri.gen import DFSCollector
+
+ROOT = "synth"
+
+
+def _function(module, qualname):
+    def f():
+        pass
+
+    f.__module__ = module
+    f.__name__ = qualname.split(".")[-1]
+    f.__qualname__ = qualname
+    return f
+
+
+def make_package(n_attributes, per_module=1000, per_class=10):
+    """
+    Create a package with about `n_attributes` attributes, and register its
+    modules in `sys.modules`.
+
+    Returns the root module and its submodules.
+    """
+    root = ModuleType(ROOT)
+    submodules = []
+    count = 0
+    while count < n_attributes:
+        name = f"{ROOT}.mod{len(submodules)}"
+        mod = ModuleType(name)
+        submodules.append(mod)
+        setattr(root, name.split(".")[-1], mod)
+        count += 1
+        for i in range(0, per_module, 4):
+            f = _function(name, f"func{i}")
+            setattr(mod, f.__name__, f)
+            methods = {
+                f"meth{j}": _function(name, f"Class{i}.meth{j}")
+                for j in range(per_class)
+            }
+            klass = type(f"Class{i}", (), methods)
+            klass.__module__ = name
+            setattr(mod, klass.__name__, klass)
+            setattr(mod, f"value{i}", i)
+            # re-exports.
+            setattr(root, f"func{i}_{len(submodules)}", f)
+            setattr(root, f"Class{i}_{len(submodules)}", klass)
+            count += 5 + per_class
+    for mod in [root, *submodules]:
+        sys.modules[mod.__name__] = mod
+    return root, submodules
+
+
+class QuadraticCollector(DFSCollector):
+    """
+    The collector before it tracked visited objects by id.
+    """
+
+    def scan(self):
+        self._open_list = list(self._open_list)
+        while len(self._open_list) >= 1:
+            current, stack = self._open_list.pop(0)
+            if id(current) not in [id(x) for x in self.obj.values()]:
+                self.visit(current, stack)
+
+    def visit(self, obj, stack):
+        from papyri.utils import full_qual
+
+        qa = full_qual(obj)
+        if not qa or not qa.split(".")[0] == self.root:
+            return
+        if obj in self.obj.values():
+            return
+        self.obj[qa] = obj
+        self.aliases[qa].append(".".join(stack))
+        if isinstance(obj, ModuleType):
+            return self.visit_ModuleType(obj, stack)
+        elif isinstance(obj, FunctionType):
+            return self.visit_FunctionType(obj, stack)
+        elif isinstance(obj, type):
+            return self.visit_ClassType(obj, stack)
+
+
+def collect(cls, n_attributes):
+    root, submodules = make_package(n_attributes)
+    collector = cls(root, submodules)
+    start = time.perf_counter()
+    items = collector.items()
+    return time.perf_counter() - start, items, dict(collector.aliases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("attributes", type=int, nargs="?", default=100_000)
+    parser.add_argument("--reference", type=int, metavar="N")
+    args = parser.parse_args()
+
+    elapsed, items, aliases = collect(DFSCollector, args.attributes)
+    print(
+        f"{args.attributes} attributes: {len(items)} objects,"
+        f" {sum(map(len, aliases.values()))} aliases in {elapsed:.2f}s"
+    )
+
+    if args.reference:
+        new = collect(DFSCollector, args.reference)
+        old = collect(QuadraticCollector, args.reference)
+        assert list(new[1]) == list(old[1]), "objects differ"
+        assert new[2] == old[2], "aliases differ"
+        print(
+            f"{args.reference} attributes: {new[0]:.2f}s,"
+            f" quadratic collector: {old[0]:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
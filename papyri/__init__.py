@@ -169,7 +169,6 @@ Directive must not have spaces before double colon::
 
 import io
 import sys
-import zipfile
 from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
@@ -242,27 +241,33 @@ def ingest(
     check: bool = False,
     relink: bool = False,
     dummy_progress: bool = typer.Option(False, help="Disable rich progress bar"),
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", help="Number of processes to process API documents with"
+    ),
 ):
     """
-    Given paths to a docbundle folder, ingest it into the known libraries.
+    Given paths to a docbundle folder or zip file, ingest it into the known libraries.
 
     Parameters
     ----------
     paths : List of Path
-        list of paths (directories) to ingest. Maybe later we want to support zipped bundled but it's the not the case
-        yet.
+        list of paths to ingest, either docbundle directories or zipped
+        docbundles, which are ingested without being extracted.
     relink : bool
         after ingesting all the path, should we rescan the whole library to find new crosslinks ?
     check : bool
         <Multiline Description Here>
     dummy_progress : bool
         <Multiline Description Here>
+    jobs : int
+        number of processes to spread the processing of API documents over,
+        documents are still written to the database by the main process.
     """
     _intro()
     from . import crosslink as cr
 
     for p in paths:
-        cr.main(Path(p), check, dummy_progress=dummy_progress)
+        cr.main(Path(p), check, dummy_progress=dummy_progress, jobs=jobs)
     if relink:
         cr.relink(dummy_progress=dummy_progress)
 
@@ -276,13 +281,15 @@ def install(
     check: bool = False,
     dummy_progress: bool = typer.Option(False, help="Disable rich progress bar"),
     relink: bool = False,
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", help="Number of processes to process API documents with"
+    ),
 ):
     """
     WIP, download and install a remote docbundle
     """
 
     from io import BytesIO
-    from tempfile import TemporaryDirectory
 
     import httpx
     import rich
@@ -375,14 +382,12 @@ def install(
     for (name, version), data in datas.items():
         if data is not None:
             # print("Downloaded", name, version, len(data) // 1024, "kb")
-            zf = zipfile.ZipFile(io.BytesIO(data), "r")
-            with TemporaryDirectory() as d:
-                zf.extractall(d)
-                cr.main(
-                    next(iter([x for x in Path(d).iterdir() if x.is_dir()])),
-                    check,
-                    dummy_progress=dummy_progress,
-                )
+            cr.main(
+                io.BytesIO(data),
+                check,
+                dummy_progress=dummy_progress,
+                jobs=jobs,
+            )
         else:
             print(f"Could not find docs for {name}=={version}")
     if datas and relink:
@@ -392,6 +397,10 @@ def install(
 @app.command()
 def relink(
     dummy_progress: bool = typer.Option(False, help="Disable rich progress bar"),
+    incremental: bool = typer.Option(
+        False,
+        help="Only revisit documents that may refer to what was ingested since the last relink",
+    ),
 ):
     """
     Rescan all the documentation to find potential new crosslinks.
@@ -399,7 +408,62 @@ def relink(
     _intro()
     from . import crosslink as cr
 
-    cr.relink(dummy_progress=dummy_progress)
+    cr.relink(dummy_progress=dummy_progress, incremental=incremental)
+
+
+@app.command()
+def migrate_store(
+    backend: str = typer.Argument(
+        ..., help="Storage backend to move to, 'files' or 'packed'."
+    ),
+):
+    """
+    Move all the ingested documents to a different storage backend.
+
+    The default ``files`` backend stores one file per document, the ``packed``
+    backend stores all of them in a single append-only pack file.
+    """
+    _intro()
+    from .config import ingest_dir
+    from .graphstore import GraphStore
+
+    store = GraphStore(ingest_dir)
+    print(f"Moving ingested documents from {store.backend!r} to {backend!r}")
+    store.migrate(backend)
+
+
+@app.command()
+def cache(
+    prune: bool = typer.Option(
+        False, help="Evict least recently used entries over the maximum size."
+    ),
+    max_size: Optional[int] = typer.Option(
+        None, help="Maximum size to prune to, in MiB, instead of the default."
+    ),
+    clear: bool = typer.Option(False, help="Remove all the entries."),
+):
+    """
+    Show statistics about the cache of jedi type inference results of
+    examples, and prune it.
+
+    Pruning also removes the cache directory of older papyri versions.
+    """
+    import shutil
+
+    from .cache import LEGACY_CACHE_DIR, jedi_cache
+
+    if clear:
+        jedi_cache.clear()
+    elif prune:
+        size = None if max_size is None else max_size * 2**20
+        print(f"Evicted {jedi_cache.prune(size)} entries")
+    if (prune or clear) and LEGACY_CACHE_DIR.exists():
+        print(f"Removing old cache directory {LEGACY_CACHE_DIR}")
+        shutil.rmtree(LEGACY_CACHE_DIR)
+    print(f"Jedi cache at {jedi_cache.path}:")
+    for k, v in jedi_cache.stats().items():
+        if k in ("entries", "size", "max_size", "file_size"):
+            print(f"  {k}: {v}")
 
 
 @app.command()
@@ -422,6 +486,15 @@ def gen(
     fail_unseen_error: bool = typer.Option(
         False, help="Overwrite fail on unseen error option"
     ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        help="Number of processes to process API docstrings with (not on Windows)",
+    ),
+    incremental: Optional[bool] = typer.Option(
+        None, help="Reuse the unchanged API objects of the previous bundle."
+    ),
 ):
     """
     Generate documentation for a given package.
@@ -460,6 +533,8 @@ def gen(
                 narrative=narrative,
                 fail_early=fail_early,
                 fail_unseen_error=fail_unseen_error,
+                jobs=jobs,
+                incremental=incremental,
             )
 
 
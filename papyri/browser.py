@@ -23,6 +23,7 @@
 Urwid tour.  Shows many of the standard widget types and features.
 """
 import sys
+from pathlib import Path
 from typing import List
 
 import urwid
@@ -36,6 +37,7 @@ from urwid.text_layout import calc_coords
 from urwid.widget import LEFT, SPACE
 
 from papyri.crosslink import RefInfo, encoder
+from papyri.graphstore import GraphStore, Key
 
 
 class Link:
@@ -228,8 +230,8 @@ def dedup(l):
     return acc
 
 
-def load(file_path, walk, qa, gen_content, frame):
-    blob = encoder.decode(file_path.read_bytes())
+def load(data, walk, qa, gen_content, frame):
+    blob = encoder.decode(data)
     assert hasattr(blob, "arbitrary")
     for i in gen_content(blob, frame):
         walk.append(i)
@@ -238,12 +240,13 @@ def load(file_path, walk, qa, gen_content, frame):
 def guess_load(rough, walk, gen_content, stack, frame):
     stack.append(rough)
 
-    candidates = list(ingest_dir.glob(f"*/*/module/{rough}"))
+    store = GraphStore(ingest_dir)
+    candidates = store.glob((None, None, "module", rough))
     if candidates:
         for _q in range(len(walk)):
             walk.pop()
         try:
-            load(candidates[0], walk, rough, gen_content, frame)
+            load(store.get(candidates[0]), walk, rough, gen_content, frame)
             return True
         except Exception as e:
             raise ValueError(str(candidates)) from e
@@ -479,12 +482,21 @@ class Renderer:
         ]
 
     def render_Fig(self, fig):
-        def show_fig(name):
-            cand = next(ingest_dir.glob(f"*/*/assets/{name}"))
+        def show_fig(ref):
             import subprocess
+            import tempfile
+
+            # assets may not be files in the store (packed backend), write
+            # a copy for quicklook.
+            store = GraphStore(ingest_dir)
+            data = store.get(Key(ref.module, ref.version, "assets", ref.path))
+            with tempfile.NamedTemporaryFile(
+                suffix=Path(ref.path).suffix, delete=False
+            ) as f:
+                f.write(data)
 
             subprocess.Popen(
-                ["qlmanage", "-p", cand],
+                ["qlmanage", "-p", f.name],
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
             )
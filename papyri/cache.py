@@ -0,0 +1,189 @@
+"""
+Persistent cache of jedi inference results for example code.
+
+Results are stored in a single sqlite file, keyed by the code, the versions of
+the installed distributions (which is what jedi infers against) and the
+version of papyri. Least recently used entries are evicted once the cache goes
+over its maximum size.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CACHE_PATH = Path("~/.cache/papyri/jedi.db").expanduser()
+
+# the old cache, one file per entry.
+LEGACY_CACHE_DIR = Path("~/.cache/papyri/jedi/").expanduser()
+
+DEFAULT_MAX_SIZE = 256 * 2**20
+
+
+@lru_cache
+def environment_key() -> str:
+    """
+    Identify the environment jedi infers types against: the interpreter, the
+    installed distributions and their versions, and papyri itself.
+    """
+    from importlib.metadata import distributions
+
+    from . import __version__
+
+    dists = sorted(
+        f"{d.metadata['Name']}=={d.version}"
+        for d in distributions()
+        if d.metadata["Name"] is not None
+    )
+    return sha256(json.dumps([__version__, sys.version, dists]).encode()).hexdigest()
+
+
+class JediCache:
+    """
+    Parameters
+    ----------
+    path : Path
+        sqlite file to store the cache in.
+    max_size : int
+        maximum size, in bytes, of the cached results; least recently used
+        entries are evicted over it.
+    """
+
+    # how many insertions between size checks.
+    _check_every = 100
+    # how many hits before writing their access times.
+    _flush_every = 1000
+
+    def __init__(self, path: Path = CACHE_PATH, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._inserted = 0
+        # access times of the hits, not written yet; updating them on each
+        # hit would take the write lock, which other workers wait on.
+        self._touched: Dict[str, float] = {}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared with forked processes.
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jedi(
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    atime REAL NOT NULL)"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS atime ON jedi(atime)")
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def _key(self, text: str, infer: bool) -> str:
+        return sha256(json.dumps([environment_key(), infer, text]).encode()).hexdigest()
+
+    def get(
+        self, text: str, infer: bool = True
+    ) -> Optional[List[Tuple[str, Optional[str]]]]:
+        key = self._key(text, infer)
+        row = self.conn.execute(
+            "SELECT value FROM jedi WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched[key] = time.time()
+        if len(self._touched) >= self._flush_every:
+            self.flush()
+        return [(token, ref) for token, ref in json.loads(row[0])]
+
+    def _write_atimes(self) -> None:
+        self.conn.executemany(
+            "UPDATE jedi SET atime = ? WHERE key = ?",
+            [(atime, key) for key, atime in self._touched.items()],
+        )
+        self._touched = {}
+
+    def flush(self) -> None:
+        """
+        Write the access times of the entries read since the last write.
+        """
+        if self._touched:
+            with self.conn:
+                self._write_atimes()
+
+    def set(self, text: str, value, infer: bool = True) -> None:
+        data = json.dumps(value)
+        with self.conn:
+            self._write_atimes()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jedi(key, value, size, atime) VALUES (?, ?, ?, ?)",
+                (self._key(text, infer), data, len(data), time.time()),
+            )
+        self._inserted += 1
+        if self._inserted % self._check_every == 0:
+            self.prune()
+
+    def size(self) -> int:
+        return self.conn.execute("SELECT total(size) FROM jedi").fetchone()[0]
+
+    def prune(self, max_size: Optional[int] = None) -> int:
+        """
+        Evict the least recently used entries until the cache is under
+        `max_size` bytes (the maximum size of the cache by default).
+
+        Returns
+        -------
+        The number of entries evicted.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        self.flush()
+        excess = self.size() - max_size
+        if excess <= 0:
+            return 0
+        evicted = 0
+        with self.conn:
+            for key, size in self.conn.execute(
+                "SELECT key, size FROM jedi ORDER BY atime"
+            ).fetchall():
+                if excess <= 0:
+                    break
+                self.conn.execute("DELETE FROM jedi WHERE key = ?", (key,))
+                excess -= size
+                evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        self._touched = {}
+        with self.conn:
+            self.conn.execute("DELETE FROM jedi")
+        self.conn.execute("VACUUM")
+
+    def stats(self) -> Dict[str, int]:
+        entries, size = self.conn.execute(
+            "SELECT count(*), total(size) FROM jedi"
+        ).fetchone()
+        return {
+            "entries": entries,
+            "size": int(size),
+            "max_size": self.max_size,
+            "file_size": self.path.stat().st_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+jedi_cache = JediCache()
@@ -1,21 +1,28 @@
 from __future__ import annotations
 
 import builtins
+import hashlib
 import json
 import logging
+import multiprocessing
 import warnings
+import zipfile
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, FrozenSet, List, Optional, Tuple, Any
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Tuple, Any, Union
 
 from rich.logging import RichHandler
 import cbor2
 from there import print
 
+from . import __version__
 from .config import ingest_dir
 from .gen import DocBlob, normalise_ref
 from .graphstore import GraphStore, Key
+from .miscs import init_worker, worker_args
 from .take2 import (
+    Directive,
     Node,
     Param,
     RefInfo,
@@ -29,10 +36,9 @@ from .take2 import (
     Cannonical,
     TocTree,
 )
-from .tree import PostDVR, resolve_, TreeVisitor
+from .tree import PostDVR, resolve_, resolver_cache, TreeVisitor
 from .utils import progress, dummy_progress
 
-
 warnings.simplefilter("ignore", UserWarning)
 
 
@@ -47,20 +53,59 @@ log = logging.getLogger("papyri")
 def find_all_refs(
     graph_store: GraphStore,
 ) -> Tuple[FrozenSet[RefInfo], Dict[str, RefInfo]]:
+    """
+    Known references and the map from path to reference, see
+    `GraphStore.known_refs`.
+    """
     assert isinstance(graph_store, GraphStore)
-    o_family = sorted(list(graph_store.glob((None, None, "module", None))))
-
     # TODO
     # here we can't compute just the dictionary and use frozenset(....values())
     # as we may have multiple version of lisbraries; this is something that will
     # need to be fixed in the long run
-    known_refs = []
-    ref_map = {}
-    for item in o_family:
-        r = RefInfo(item.module, item.version, "module", item.path)
-        known_refs.append(r)
-        ref_map[r.path] = r
-    return frozenset(known_refs), ref_map
+    return graph_store.known_refs()
+
+
+# roles of directives that are references to python objects, when they are
+# still directives after ingestion they could not be resolved.
+_REFERENCE_ROLES = {
+    None,
+    "any",
+    "obj",
+    "mod",
+    "func",
+    "meth",
+    "class",
+    "attr",
+    "data",
+    "exc",
+}
+
+
+def unresolved_references(nodes) -> Set[Tuple[str, str]]:
+    """
+    Find the references in `nodes` that could not be resolved.
+
+    Returns
+    -------
+    set of (kind, name)
+        kind is ``"directive"`` for python role directives that are left
+        untouched, and ``"missing"`` for references to a missing
+        (or ``to-resolve``) `RefInfo`.
+    """
+    visitor = TreeVisitor({Directive, RefInfo})
+    res = set()
+    for node in nodes:
+        found = visitor.generic_visit(node)
+        for d in found.get(Directive, []):
+            if d.domain in (None, "py") and d.role in _REFERENCE_ROLES:
+                name = d.value
+                if " <" in name and name.endswith(">"):
+                    name = name.split(" <")[-1][:-1]
+                res.add(("directive", name.lstrip("~")))
+        for r in found.get(RefInfo, []):
+            if r.kind in ("missing", "to-resolve"):
+                res.add(("missing", r.path))
+    return res
 
 
 @register(4010)
@@ -129,6 +174,38 @@ class IngestedBlobs(Node):
         )
         return list(sorted(ssr))
 
+    def unresolved_see_also(self) -> List[SeeAlsoItem]:
+        """
+        Items of the see also section that could not be resolved, and that
+        relink will try to resolve again.
+
+        gen marks all of them as existing, but leaves a ``to-resolve``
+        reference for the ones it could not find.
+        """
+        return [
+            sa
+            for sa in self.see_also
+            if not (
+                sa.name.exists
+                and sa.name.reference is not None
+                and sa.name.reference.kind == "module"
+            )
+        ]
+
+    def unresolved_refs(self) -> List[Tuple[str, str]]:
+        """
+        All the references of this document that could not be resolved, as
+        (kind, name), see `unresolved_references`.
+        """
+        refs = unresolved_references(
+            list(self.content.values())
+            + [self.example_section_data]  # type: ignore
+            + self.arbitrary  # type: ignore
+            + [d for sa in self.see_also for d in sa.descriptions]
+        )
+        refs.update(("see-also", sa.name.value) for sa in self.unresolved_see_also())
+        return sorted(refs)
+
     def process(
         self, known_refs, aliases: Optional[Dict[str, str]], verbose=True, *, version
     ) -> None:
@@ -229,23 +306,169 @@ def load_one_uningested(
     return blob
 
 
+@contextmanager
+def open_bundle(source) -> Iterator[Union[Path, zipfile.Path]]:
+    """
+    Context manager giving the root directory of a docbundle.
+
+    Parameters
+    ----------
+    source
+        a bundle directory, a path to a zipped bundle, or a `zipfile.ZipFile`
+        or binary file object of a zipped bundle.
+
+    Yields
+    ------
+    Path or zipfile.Path
+        Zipped bundles are not extracted, their members are read as they are
+        ingested. Archives opened here are closed on exit, a `zipfile.ZipFile`
+        given as `source` is left open.
+
+    Examples
+    --------
+    >>> with open_bundle("numpy_1.22.0.zip") as root:  # doctest: +SKIP
+    ...     meta = json.loads((root / "papyri.json").read_text())
+    """
+    if isinstance(source, zipfile.Path):
+        yield source
+        return
+    if isinstance(source, (str, Path)):
+        source = Path(source)
+        assert source.exists(), f"{source} does not exists"
+        if source.is_dir():
+            yield source
+            return
+    archive = source if isinstance(source, zipfile.ZipFile) else zipfile.ZipFile(source)
+    try:
+        # the bundle is a single module_version directory in the archive.
+        dirs = [p for p in zipfile.Path(archive).iterdir() if p.is_dir()]
+        if len(dirs) != 1:
+            raise ValueError(
+                f"Expected a single bundle directory in {archive.filename}, got {dirs}"
+            )
+        yield dirs[0]
+    finally:
+        if archive is not source:
+            archive.close()
+
+
+def _iterdir(path):
+    """
+    Content of a bundle directory, if it exists.
+
+    `zipfile.Path` does not have ``glob`` on all the Python versions we support.
+    """
+    if not path.exists():
+        return []
+    return path.iterdir()
+
+
+def _source_hash(data: bytes, context: str = "") -> str:
+    """
+    Hash of a bundle file, and of what else goes into ingesting it.
+
+    Stored with the ingested document, to skip it when re-ingesting the same
+    file; `context` should change whenever the same file would be ingested
+    differently.
+    """
+    h = hashlib.sha256(context.encode())
+    h.update(data)
+    return h.hexdigest()
+
+
+def _process_api_file(
+    qa: str, data: bytes, known_refs, aliases: Dict[str, str], version: str, root: str
+) -> Tuple[Key, bytes, List[Key], List[Tuple[str, str]]]:
+    """
+    Load, process and validate one ``module/*.json`` file of a bundle.
+
+    This only depends on its arguments, so it can run in worker processes.
+
+    Returns
+    -------
+    key : Key
+    data : bytes
+        the encoded `IngestedBlobs`.
+    forward_refs : list of Key
+    unresolved : list of (kind, name)
+        see `IngestedBlobs.unresolved_refs`.
+    """
+    try:
+        # TODO: version issue
+        doc_blob = load_one_uningested(
+            data,
+            qa=qa,
+            known_refs=known_refs,
+            aliases=aliases,
+            version=version,
+        )
+        assert hasattr(doc_blob, "arbitrary")
+    except Exception as e:
+        raise RuntimeError(f"error Reading to {qa}") from e
+
+    for k, v in doc_blob.content.items():
+        assert isinstance(v, Section), f"section {k} is not a Section: {v!r}"
+    try:
+        doc_blob.validate()
+    except Exception as e:
+        raise type(e)(f"from {qa}")
+    mod_root = qa.split(".")[0]
+    assert mod_root == root, f"{mod_root}, {root}"
+
+    # TODO: FIX
+    # when walking the tree of figure we can't properly crosslink
+    # as we don't know the version number.
+    # fix it at serialisation time.
+    forward_refs = doc_blob.all_forward_refs()
+
+    key = Key(mod_root, version, "module", qa)
+    assert version is not None
+    assert None not in key
+    return key, encoder.encode(doc_blob), forward_refs, doc_blob.unresolved_refs()
+
+
+def _process_api_file_worker(item: Tuple[str, bytes]):
+    # arguments common to all the files of a bundle, set once per worker
+    # process to not send known_refs with each file.
+    qa, data = item
+    return _process_api_file(qa, data, *worker_args())
+
+
 class Ingester:
-    def __init__(self, dp):
-        self.ingest_dir = ingest_dir
+    def __init__(self, dp, jobs: int = 1, root: Optional[Path] = None):
+        """
+        Parameters
+        ----------
+        dp : bool
+            use a dummy progress bar.
+        jobs : int
+            number of processes to process API documents with.
+        root : Path, optional
+            directory of the graph store to ingest into, defaults to
+            `ingest_dir`.
+        """
+        self.ingest_dir = ingest_dir if root is None else Path(root)
         self.gstore = GraphStore(self.ingest_dir)
         self.progress = dummy_progress if dp else progress
+        self.jobs = jobs
 
-    def _ingest_narrative(self, path, gstore: GraphStore) -> None:
+    def _ingest_narrative(self, path, gstore: GraphStore, context: str) -> None:
         meta = json.loads((path / "papyri.json").read_text())
         version = meta["version"]
+        module, version = path.name.split("_")
+        hashes = gstore.get_hashes(module, version, "docs")
         for _console, document in self.progress(
-            (path / "docs").glob("*"),
+            _iterdir(path / "docs"),
             description=f"{path.name} Reading narrative docs ",
         ):
+            data = document.read_bytes()
+            source_hash = _source_hash(data, context)
+            if hashes.get(document.name) == source_hash:
+                continue
 
             try:
                 doc = load_one_uningested(
-                    document.read_bytes(),
+                    data,
                     qa=document.name,
                     known_refs=frozenset(),
                     aliases={},
@@ -255,14 +478,15 @@ class Ingester:
                 raise type(e)(f"at path: {document}")
             ref = document.name
 
-            module, version = path.name.split("_")
             key = Key(module, version, "docs", ref)
             doc.validate()
             gstore.put(
                 key,
                 encoder.encode(doc),
                 [],
+                source_hash,
             )
+            gstore.put_unresolved(key, doc.unresolved_refs())
         tocfile = path / "toc.json"
         if tocfile.exists():
             toc = json.loads((path / "toc.json").read_text())
@@ -291,14 +515,25 @@ class Ingester:
             )
 
     def _ingest_examples(
-        self, path: Path, gstore: GraphStore, known_refs, aliases, version, root
+        self,
+        path: Path,
+        gstore: GraphStore,
+        known_refs,
+        aliases,
+        version,
+        root,
+        context: str,
     ):
-
+        hashes = gstore.get_hashes(root, version, "examples")
         for _, fe in self.progress(
-            (path / "examples/").glob("*"),
+            _iterdir(path / "examples"),
             description=f"{path.name} Reading Examples ...   ",
         ):
-            s = Section.from_dict(json.loads(fe.read_bytes()))
+            data = fe.read_bytes()
+            source_hash = _source_hash(data, context)
+            if hashes.get(fe.name) == source_hash:
+                continue
+            s = Section.from_dict(json.loads(data))
             visitor = PostDVR(
                 f"TBD (examples, {path}), supposed to be QA",
                 known_refs,
@@ -313,16 +548,26 @@ class Ingester:
                     Key(root, version, "examples", fe.name),
                     encoder.encode(s_code),
                     refs,
+                    source_hash,
+                )
+                gstore.put_unresolved(
+                    Key(root, version, "examples", fe.name),
+                    unresolved_references([s_code]),
                 )
             except Exception:
                 raise
 
     def _ingest_assets(self, path, root, version, aliases, gstore):
+        hashes = gstore.get_hashes(root, version, "assets")
         for _, f2 in self.progress(
-            (path / "assets").glob("*"),
+            _iterdir(path / "assets"),
             description=f"{path.name} Reading image files ...",
         ):
-            gstore.put(Key(root, version, "assets", f2.name), f2.read_bytes(), [])
+            data = f2.read_bytes()
+            # assets are hashed by content, see GraphStore.put
+            if hashes.get(f2.name) == _source_hash(data):
+                continue
+            gstore.put(Key(root, version, "assets", f2.name), data, [])
 
         gstore.put(
             Key(root, version, "meta", "aliases.cbor"),
@@ -331,33 +576,55 @@ class Ingester:
             [],
         )
 
-    def ingest(self, path: Path, check: bool) -> None:
+    def ingest(self, path, check: bool) -> None:
+        """
+        Parameters
+        ----------
+        path
+            the bundle to ingest, see `open_bundle`.
+        check : bool
+        """
+        with open_bundle(path) as path:
+            gstore = self.gstore
+
+            known_refs, _ = find_all_refs(gstore)
+
+            ###
+
+            meta_path = path / "papyri.json"
+            data = json.loads(meta_path.read_text())
+            version = data["version"]
+            root = data["module"]
+            # long : short
+            aliases: Dict[str, str] = data.get("aliases", {})
+            # rev_aliases = {Cannonical(v): FullQual(k) for k, v in aliases.items()}
+            meta = {k: v for k, v in data.items() if k != "aliases"}
+
+            # a single transaction for the whole bundle.
+            with gstore.batch():
+                self._ingest_bundle(
+                    path, check, known_refs, meta, aliases, version, root
+                )
 
+    def _ingest_bundle(self, path, check, known_refs, meta, aliases, version, root):
         gstore = self.gstore
-
-        known_refs, _ = find_all_refs(gstore)
-
-        nvisited_items = {}
-
-        ###
-
-        meta_path = path / "papyri.json"
-        data = json.loads(meta_path.read_text())
-        version = data["version"]
-        root = data["module"]
-        # long : short
-        aliases: Dict[str, str] = data.get("aliases", {})
-        # rev_aliases = {Cannonical(v): FullQual(k) for k, v in aliases.items()}
-        meta = {k: v for k, v in data.items() if k != "aliases"}
+        source_hashes: Dict[str, str] = {}
 
         gstore.put_meta(root, version, encoder.encode(meta))
 
-        self._ingest_examples(path, gstore, known_refs, aliases, version, root)
+        # Documents whose source and context did not change since the last
+        # ingestion are skipped; they are not re-resolved against references
+        # that appeared since, which is what relink is for.
+        context = json.dumps([__version__, version, aliases], sort_keys=True)
+        self._ingest_examples(path, gstore, known_refs, aliases, version, root, context)
         self._ingest_assets(path, root, version, aliases, gstore)
-        self._ingest_narrative(path, gstore)
+        self._ingest_narrative(path, gstore, context)
 
+        hashes = gstore.get_hashes(root, version, "module")
+        unchanged = 0
+        todo: List[Tuple[str, bytes]] = []
         for _, f1 in self.progress(
-            (path / "module").glob("*"),
+            _iterdir(path / "module"),
             description=f"{path.name} Reading api files ...  ",
         ):
             assert f1.name.endswith(".json")
@@ -369,18 +636,15 @@ class Ingester:
                     print(f"skip {qa=}, {rqa=}")
                     continue
                 assert rqa == qa, f"{rqa} !+ {qa}"
-            try:
-                # TODO: version issue
-                nvisited_items[qa] = load_one_uningested(
-                    f1.read_bytes(),
-                    qa=qa,
-                    known_refs=known_refs,
-                    aliases=aliases,
-                    version=version,
-                )
-                assert hasattr(nvisited_items[qa], "arbitrary")
-            except Exception as e:
-                raise RuntimeError(f"error Reading to {f1}") from e
+            data = f1.read_bytes()
+            source_hash = _source_hash(data, context)
+            if hashes.get(qa) == source_hash:
+                unchanged += 1
+                continue
+            todo.append((qa, data))
+            source_hashes[qa] = source_hash
+        if unchanged:
+            print(f"{path.name} {unchanged} unchanged api files")
 
         # known_refs_II = frozenset(nvisited_items.keys())
 
@@ -389,46 +653,58 @@ class Ingester:
         #    RefInfo(root, version, "module", qa) for qa in known_refs_II
         # ).union(known_refs)
 
-        for _, (qa, doc_blob) in self.progress(
-            nvisited_items.items(), description=f"{path.name} Validating..."
-        ):
-            for k, v in doc_blob.content.items():
-                assert isinstance(v, Section), f"section {k} is not a Section: {v!r}"
-            try:
-                doc_blob.validate()
-            except Exception as e:
-                raise type(e)(f"from {qa}")
-            mod_root = qa.split(".")[0]
-            assert mod_root == root, f"{mod_root}, {root}"
-        for _, (qa, doc_blob) in self.progress(
-            nvisited_items.items(), description=f"{path.name} Writing..."
-        ):
-            # for qa, doc_blob in nvisited_items.items():
-            # we might update other modules with backrefs
-            assert hasattr(doc_blob, "arbitrary")
-
-            # TODO: FIX
-            # when walking the tree of figure we can't properly crosslink
-            # as we don't know the version number.
-            # fix it at serialisation time.
-            forward_refs = doc_blob.all_forward_refs()
-            # print(len(forward_refs))
-
-            try:
-                key = Key(mod_root, version, "module", qa)
-                assert mod_root is not None
-                assert version is not None
-                assert None not in key
-                gstore.put(
-                    key,
-                    encoder.encode(doc_blob),
-                    forward_refs,
-                )
-
-            except Exception as e:
-                raise RuntimeError(f"error writing to {path}") from e
-
-    def relink(self) -> None:
+        args = (known_refs, aliases, version, root)
+        unresolved: Dict[Key, List[Tuple[str, str]]] = {}
+
+        def _to_write(results):
+            # documents are written as they are processed, by this process
+            # only, which owns the database connection.
+            for _, (qa, _data) in self.progress(
+                todo, description=f"{path.name} Processing and writing..."
+            ):
+                key, data, forward_refs, unresolved[key] = next(results)
+                assert key.path == qa
+                yield key, data, forward_refs, source_hashes[qa]
+
+        try:
+            if self.jobs > 1 and len(todo) > 1:
+                with multiprocessing.Pool(
+                    self.jobs, initializer=init_worker, initargs=args
+                ) as pool:
+                    chunksize = max(1, min(64, len(todo) // (4 * self.jobs)))
+                    results = pool.imap(_process_api_file_worker, todo, chunksize)
+                    gstore.put_many(_to_write(results))
+            else:
+                results = (_process_api_file(qa, data, *args) for qa, data in todo)
+                gstore.put_many(_to_write(results))
+        except Exception as e:
+            raise RuntimeError(f"error writing to {path}") from e
+        for key, refs in unresolved.items():
+            gstore.put_unresolved(key, refs)
+
+    def relink(self, incremental: bool = False) -> None:
+        """
+        Try to resolve again the references that could not be resolved at
+        ingestion, typically because they point to a library ingested later.
+
+        Parameters
+        ----------
+        incremental : bool
+            Only revisit the documents with unresolved see also names that may refer to
+            a reference that was not known at the last relink, instead of all
+            the documents. Falls back to a full relink if the store was never
+            relinked.
+
+        Notes
+        -----
+        Unresolved names are matched against the new references if they are a
+        dotted suffix of one (after alias expansion), which is how most names
+        are resolved; the few that `resolve_` would find with a looser match
+        are only picked up by a full relink.
+
+        Examples are only revisited in a full relink, their processing does
+        not depend on the known references.
+        """
 
         gstore = self.gstore
         known_refs, _ = find_all_refs(gstore)
@@ -443,9 +719,29 @@ class Ingester:
         )
         builtins.print("Press Ctrl-C to abort...")
 
-        for _, key in self.progress(
-            gstore.glob((None, None, "module", None)), description="Relinking..."
-        ):
+        previous = gstore.get_relinked_refs() if incremental else None
+        if previous is None:
+            to_relink = gstore.glob((None, None, "module", None))
+            examples = gstore.glob((None, None, "examples", None))
+        else:
+            new_paths = {r.path for r in known_refs if Key(*r) not in previous}
+            to_relink = _maybe_resolvable(
+                gstore.get_unresolved(kind="see-also"), new_paths, rev_aliases
+            )
+            examples = []
+            builtins.print(
+                f"{len(new_paths)} new references, relinking {len(to_relink)} documents"
+            )
+
+        with gstore.batch():
+            self._relink_documents(to_relink, known_refs, rev_aliases)
+            self._relink_examples(examples, known_refs, aliases)
+            gstore.set_relinked_refs(Key(*r) for r in known_refs)
+        log.info("resolver cache: %s", resolver_cache.stats())
+
+    def _relink_documents(self, keys, known_refs, rev_aliases) -> None:
+        gstore = self.gstore
+        for _, key in self.progress(keys, description="Relinking..."):
             try:
                 data, back, forward = gstore.get_all(key)
             except Exception as e:
@@ -457,9 +753,7 @@ class Ingester:
                 raise type(e)(key)
             assert doc_blob.content is not None, data
 
-            for sa in doc_blob.see_also:
-                if sa.name.exists:
-                    continue
+            for sa in doc_blob.unresolved_see_also():
                 r = resolve_(
                     key.path,
                     known_refs,
@@ -474,18 +768,16 @@ class Ingester:
 
             # end todo
 
-            data = encoder.encode(doc_blob)
             for s in forward:
                 assert isinstance(s, Key)
-            forward_refs = set(forward)
-            ss2 = doc_blob.all_forward_refs()
-            if ss2 != forward_refs:
-                gstore.put(key, data, forward_refs)
-
-        for _, key in progress(
-            gstore.glob((None, None, "examples", None)),
-            description="Relinking Examples...",
-        ):
+            forward_refs = set(doc_blob.all_forward_refs())
+            if forward_refs != forward:
+                gstore.put(key, encoder.encode(doc_blob), forward_refs)
+            gstore.put_unresolved(key, doc_blob.unresolved_refs())
+
+    def _relink_examples(self, keys, known_refs, aliases) -> None:
+        gstore = self.gstore
+        for _, key in progress(keys, description="Relinking Examples..."):
             s = encoder.decode(gstore.get(key))
             assert isinstance(s, Section), (s, key)
             dvr = PostDVR(
@@ -502,9 +794,33 @@ class Ingester:
                 encoder.encode(s_code),
                 refs,
             )
+            gstore.put_unresolved(key, unresolved_references([s_code]))
+
 
+def _maybe_resolvable(
+    unresolved: Dict[Key, Set[str]], new_paths: Set[str], rev_aliases
+) -> List[Key]:
+    """
+    Documents with unresolved names that may resolve to one of `new_paths`.
 
-def main(path, check, *, dummy_progress):
+    A name is considered when it is a dotted suffix of one of the new paths,
+    like ``ndarray`` or ``numpy.ndarray`` for ``numpy.ndarray``.
+    """
+    suffixes: Set[str] = set()
+    for path in new_paths:
+        parts = path.split(".")
+        suffixes.update(".".join(parts[i:]) for i in range(len(parts)))
+    res = []
+    for key, names in unresolved.items():
+        for name in names:
+            name = rev_aliases.get(name, name).lstrip("~.")
+            if name in suffixes:
+                res.append(key)
+                break
+    return sorted(res)
+
+
+def main(path, check, *, dummy_progress, jobs=1):
     """
     Parameters
     ----------
@@ -512,23 +828,24 @@ def main(path, check, *, dummy_progress):
         whether to use a dummy progress bar instead of the rich one.
         Usefull when dropping into PDB.
         To be implemented. See gen step.
+    jobs : int
+        number of processes to process API documents with.
     check : <Insert Type here>
         <Multiline Description Here>
     path : <Insert Type here>
-        <Multiline Description Here>
+        bundle directory or zipped bundle, see `open_bundle`.
     """
-    builtins.print("Ingesting", path.name, "...")
     from time import perf_counter
 
-    now = perf_counter()
+    with open_bundle(path) as root:
+        builtins.print("Ingesting", root.name, "...")
+        now = perf_counter()
 
-    assert path.exists(), f"{path} does not exists"
-    assert path.is_dir(), f"{path} is not a directory"
-    Ingester(dp=dummy_progress).ingest(path, check)
-    delta = perf_counter() - now
+        Ingester(dp=dummy_progress, jobs=jobs).ingest(root, check)
+        delta = perf_counter() - now
 
-    builtins.print(f"{path.name} Ingesting done in {delta:0.2f}s")
+    builtins.print(f"{root.name} Ingesting done in {delta:0.2f}s")
 
 
-def relink(dummy_progress):
-    Ingester(dp=dummy_progress).relink()
+def relink(dummy_progress, incremental=False):
+    Ingester(dp=dummy_progress).relink(incremental)
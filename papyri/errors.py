@@ -36,3 +36,29 @@ class SerialisationError(Exception):
 
 class UnseenError(Exception):
     pass
+
+
+class WorkerError(Exception):
+    """
+    An error raised while processing in a worker process, carries
+    the original exception name and traceback.
+    """
+
+    def __init__(self, ename: str, tb: str):
+        super().__init__(ename, tb)
+        self.ename = ename
+
+    def __str__(self):
+        return f"{self.ename} in worker process:\n{self.args[1]}"
+
+
+class ExecutionTimeoutError(TimeoutError):
+    pass
+
+
+class ExecutionMemoryError(MemoryError):
+    pass
+
+
+class ExecutorCrashedError(RuntimeError):
+    pass
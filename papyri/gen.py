@@ -13,23 +13,40 @@ from __future__ import annotations
 import dataclasses
 import datetime
 import importlib
+import importlib.util
 import inspect
 import json
 import logging
+import multiprocessing
+import multiprocessing.pool
 import os
+import pkgutil
 import re
 import site
 import sys
 import tempfile
+import time
+import traceback
 import warnings
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import ExitStack
 from dataclasses import dataclass
 from functools import lru_cache
 from hashlib import sha256
 from itertools import count
 from pathlib import Path
 from types import FunctionType, ModuleType
-from typing import Any, Dict, List, MutableMapping, Optional, Sequence, Tuple, FrozenSet
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    List,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+    FrozenSet,
+)
 from hashlib import sha256
 
 import jedi
@@ -44,8 +61,16 @@ from rich.progress import BarColumn, Progress, TextColumn
 from there import print
 from velin.examples_section_utils import InOut, splitblank, splitcode
 
-from .errors import IncorrectInternalDocsLen, NumpydocParseError, UnseenError
-from .miscs import BlockExecutor, DummyP
+from .cache import environment_key, jedi_cache
+from .errors import (
+    ExecutionMemoryError,
+    ExecutionTimeoutError,
+    IncorrectInternalDocsLen,
+    NumpydocParseError,
+    UnseenError,
+    WorkerError,
+)
+from .miscs import BlockExecutor, DummyP, Sandbox, init_worker, worker_args
 from .take2 import (
     FullQual,
     Cannonical,
@@ -67,7 +92,7 @@ from .take2 import (
     parse_rst_section,
 )
 from .toc import make_tree
-from .tree import DVR
+from .tree import DVR, import_cache, resolve_
 from .utils import TimeElapsedColumn, dedent_but_first, pos_to_nl, progress, full_qual
 from .vref import NumpyDocString
 
@@ -99,7 +124,7 @@ class ErrorCollector:
             return
         if exc_type:
             self.errored = True
-            ename = exc_type.__name__
+            ename = getattr(exc_val, "ename", exc_type.__name__)
             if ename in self._expected_unseen.get(self._qa, []):
                 self._expected_unseen[self._qa].remove(ename)
                 if not self._expected_unseen[self._qa]:
@@ -116,6 +141,80 @@ class ErrorCollector:
         # return True
 
 
+class _ErrorRecorder:
+    """
+    Stand in for an `ErrorCollector` in worker processes.
+
+    Records the outcome of each block, for the parent process to replay them
+    in its `ErrorCollector`, in order.
+    """
+
+    def __init__(self):
+        self.outcomes: List[Tuple[str, Optional[WorkerError]]] = []
+
+    def __call__(self, qa):
+        self._qa = qa
+        return self
+
+    def __enter__(self):
+        self.errored = False
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is KeyboardInterrupt:
+            return
+        error = None
+        if exc_type:
+            self.errored = True
+            error = WorkerError(exc_type.__name__, traceback.format_exc())
+        self.outcomes.append((self._qa, error))
+        return True
+
+
+# there is no fork on windows, and no parallel gen.
+if sys.platform != "win32":
+
+    class _WorkerProcess(multiprocessing.context.ForkProcess):
+        """
+        Process of the `collect_api_docs` pool that is not a daemon.
+
+        Pool workers are made daemons, and daemons can't have children, but
+        workers executing examples need to start a `Sandbox` process. The
+        pool terminates its workers on exit anyway, and a sandbox exits when
+        its worker dies.
+        """
+
+        @property
+        def daemon(self) -> bool:
+            return False
+
+        @daemon.setter
+        def daemon(self, value: bool) -> None:
+            pass
+
+    class _WorkerContext(multiprocessing.context.ForkContext):
+        Process = _WorkerProcess
+
+
+def _process_api_object_worker(qa: str):
+    # shared with the forked workers, see Gen.collect_api_docs.
+    gen, collected, aliases, known_refs, rev_aliases = worker_args()
+    recorder = _ErrorRecorder()
+    failures: Dict[str, List[str]] = defaultdict(list)
+    res = gen._process_api_object(
+        qa,
+        collected[qa],
+        aliases[qa],
+        known_refs,
+        rev_aliases,
+        recorder,
+        failures,
+    )
+    # workers are terminated without a chance to write them at the end.
+    jedi_cache.flush()
+    return res, recorder.outcomes, dict(failures), import_cache.take_new()
+
+
 try:
     from . import ts
 except (ImportError, OSError):
@@ -144,9 +243,6 @@ def paragraph(lines: List[str]) -> Any:
     return p2
 
 
-_JEDI_CACHE = Path("~/.cache/papyri/jedi/").expanduser()
-
-
 def _hashf(text):
     ##  for cache expiring every day.
     ## for every hours, change to 0:13.
@@ -154,24 +250,6 @@ def _hashf(text):
     return sha256(text.encode()).hexdigest() + datetime.datetime.now().isoformat()[0:10]
 
 
-def _jedi_get_cache(text):
-
-    _JEDI_CACHE.mkdir(exist_ok=True, parents=True)
-
-    _cache = _JEDI_CACHE / _hashf(text)
-    if _cache.exists():
-        return tuple(tuple(x) for x in json.loads(_cache.read_text()))
-
-    return None
-
-
-def _jedi_set_cache(text, value):
-    _JEDI_CACHE.mkdir(exist_ok=True, parents=True)
-
-    _cache = _JEDI_CACHE / _hashf(text)
-    _cache.write_text(json.dumps(value))
-
-
 def obj_from_qualname(name):
 
     mod_name, sep, objs = name.partition(":")
@@ -186,8 +264,133 @@ def obj_from_qualname(name):
         return obj
 
 
+def _qualname_spec(path: str) -> str:
+    """
+    Dotted `path` of an object in the ``module:qualname`` form of
+    `obj_from_qualname`, splitting it after the longest imported module.
+    """
+    parts = path.split(".")
+    for i in range(len(parts), 0, -1):
+        if ".".join(parts[:i]) in sys.modules:
+            break
+    module, attrs = ".".join(parts[:i]), ".".join(parts[i:])
+    return f"{module}:{attrs}" if attrs else module
+
+
+def _namespace_spec(
+    ns: Dict[str, Any], paths: Optional[Dict[str, str]] = None
+) -> Optional[Dict[str, str]]:
+    """
+    Qualified names of the values of `ns`, to be imported with
+    `obj_from_qualname`, or None if one of them can't be.
+
+    Values are looked up by their module and qualname, or by their dotted
+    path in `paths` if given: methods descriptors or plain values (like
+    ``numpy.pi``) do not have a module and qualname leading back to them.
+    """
+    spec = {}
+    for k, v in ns.items():
+        if isinstance(v, ModuleType):
+            names = [v.__name__]
+        else:
+            names = [
+                f"{getattr(v, '__module__', None)}:{getattr(v, '__qualname__', '')}"
+            ]
+        if paths and k in paths:
+            names.append(_qualname_spec(paths[k]))
+        for name in names:
+            try:
+                if obj_from_qualname(name) is v:
+                    spec[k] = name
+                    break
+            except Exception:
+                pass
+        else:
+            return None
+    return spec
+
+
+class _RecordingDVR(DVR):
+    """
+    DVR recording the references it resolves and imports, with their results.
+
+    What a DocBlob links to only depends on the other objects through these,
+    see `_resolve_link`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.links: Dict[Tuple[Any, ...], Any] = {}
+
+    def _resolve(self, loc, text):
+        r = super()._resolve(loc, text)
+        self.links[("directive", tuple(sorted(loc)), text)] = list(r)
+        return r
+
+    def _import_solver(self, maybe_qa: str) -> Optional[str]:  # type: ignore[override]
+        res = DVR._import_solver(maybe_qa)
+        self.links[("import", (), maybe_qa)] = res
+        return res
+
+
+def _resolve_link(
+    qa: str,
+    link: Sequence[Any],
+    known_refs: FrozenSet[RefInfo],
+    rev_aliases: Dict[Cannonical, FullQual],
+) -> Any:
+    """
+    Resolve again a ``(kind, local refs, name)`` link recorded when
+    processing `qa`, see `Gen._process_api_object`.
+    """
+    kind, loc, text = link
+    if kind == "import":
+        return DVR._import_solver(text)
+    # gen resolves directives without aliases, see also with them.
+    aliases = rev_aliases if kind == "see-also" else {}
+    return list(resolve_(qa, known_refs, frozenset(loc), text, rev_aliases=aliases))
+
+
+class JediSession:
+    """
+    Jedi script of all the example code of a docstring.
+
+    `parse_script` is called on each block of code with the previous blocks
+    as context; creating a new jedi script for each re-parses and re-infers
+    the context, which is quadratic in the number of blocks. A session
+    creates one on the code of all the blocks, and each block is inferred at
+    its position in it, reusing what jedi inferred for the previous ones.
+
+    Jedi only resolves names with the code before them, so the code of the
+    following blocks does not change the results.
+    """
+
+    def __init__(self, text: str, ns: Dict):
+        self.text = text
+        self.ns = ns
+        self._jed = None
+
+    def covers(self, text: str) -> bool:
+        return self.text.startswith(text)
+
+    @property
+    def jed(self):
+        if self._jed is None:
+            if self.ns:
+                self._jed = jedi.Interpreter(self.text, namespaces=[self.ns])
+            else:
+                self._jed = jedi.Script(self.text)
+        return self._jed
+
+
 def parse_script(
-    script: str, ns: Dict, prev, config, *, where=None
+    script: str,
+    ns: Dict,
+    prev,
+    config,
+    *,
+    where=None,
+    session: Optional[JediSession] = None,
 ) -> Optional[List[Tuple[str, Optional[str]]]]:
     """
     Parse a script into tokens and use Jedi to infer the fully qualified names
@@ -206,6 +409,9 @@ def parse_script(
         <Multiline Description Here>
     config : <Insert Type here>
         <Multiline Description Here>
+    session : JediSession, optional
+        jedi session of the code `prev` and `script` are the start of, to
+        infer with instead of creating new jedi scripts.
 
     Returns
     -------
@@ -222,13 +428,18 @@ def parse_script(
 
     l_delta = len(prev.split("\n"))
     contextscript = prev + "\n" + script
-    if ns:
-        jeds.append(jedi.Interpreter(contextscript, namespaces=[ns]))
     full_text = prev + "\n" + script
-    k = _jedi_get_cache(full_text)
+    if session is not None and not session.covers(full_text):
+        session = None
+    if ns and session is None:
+        jeds.append(jedi.Interpreter(contextscript, namespaces=[ns]))
+    k = jedi_cache.get(full_text, config.infer)
     if k is not None:
         return k
-    jeds.append(jedi.Script(full_text))
+    if session is None:
+        jeds.append(jedi.Script(full_text))
+    else:
+        jeds.append(session.jed)
     P = PythonLexer()
 
     acc: List[Tuple[str, Optional[str]]] = []
@@ -265,7 +476,7 @@ def parse_script(
                     return None
             break
         acc.append((text, ref))
-    _jedi_set_cache(full_text, acc)
+    jedi_cache.set(full_text, acc, config.infer)
     warnings.simplefilter("default", UserWarning)
     for a in acc:
         assert len(a) == 2
@@ -280,6 +491,8 @@ class ExecutionStatus(Enum):
     compiled = "compiled"
     syntax_error = "syntax_error"
     exec_error = "exception_in_exec"
+    timeout = "timeout"
+    memory_limit = "memory_limit"
 
 
 def _execute_inout(item):
@@ -401,22 +614,63 @@ class Config:
     exclude: Sequence[str] = ()  # list of dotted object name to exclude from collection
     examples_folder: Optional[str] = None  # < to path ?
     submodules: Sequence[str] = ()
+    # find all the (public, not excluded) submodules from the package files,
+    # and import them while collecting, instead of only the ones above.
+    discover_submodules: bool = False
     exec: bool = False
     source: Optional[str] = None
     homepage: Optional[str] = None
     docs: Optional[str] = None
     docs_path: Optional[str] = None
     wait_for_plt_show: Optional[bool] = True
+    # execute examples in a separate process, which is restarted if it
+    # crashes, or goes over the limits below; setting a limit implies it.
+    exec_sandbox: bool = False
+    # wall-clock limit (seconds) and memory limit (MiB) to execute one block
+    exec_timeout: Optional[float] = None
+    exec_memory_limit: Optional[int] = None
+    # overrides of the above per dotted qualname prefix (so "numpy.lin" does
+    # not apply to "numpy.linalg"), the longest matching wins:
+    # {"scipy.signal": {"timeout": 120, "memory_limit": 4096}}
+    exec_limits: Dict[str, Dict[str, float]] = dataclasses.field(default_factory=dict)
     examples_exclude: Sequence[str] = ()
     exclude_jedi: Sequence[str] = ()
     implied_imports: Dict[str, str] = dataclasses.field(default_factory=dict)
     expected_errors: Dict[str, List[str]] = dataclasses.field(default_factory=dict)
     early_error: bool = True
     fail_unseen_error: bool = False
+    # reuse the API objects of the previous bundle whose docstring, signature,
+    # source file, and the configuration did not change; examples are not
+    # re-executed if only other files they use did.
+    incremental: bool = False
 
     def replace(self, **kwargs):
         return dataclasses.replace(self, **kwargs)
 
+    def exec_limits_for(self, qa: str) -> Tuple[Optional[float], Optional[int]]:
+        """
+        Timeout and memory limit to execute the examples of `qa`.
+        """
+        timeout, memory_limit = self.exec_timeout, self.exec_memory_limit
+        prefixes = [p for p in self.exec_limits if qa == p or qa.startswith(p + ".")]
+        if prefixes:
+            limits = self.exec_limits[max(prefixes, key=len)]
+            timeout = limits.get("timeout", timeout)
+            if "memory_limit" in limits:
+                memory_limit = int(limits["memory_limit"])
+        return timeout, memory_limit
+
+
+# options that do not change the content of a bundle.
+_NOT_IN_KEY = {"dry_run", "dummy_progress", "early_error", "fail_unseen_error"}
+
+
+def _config_key(config: Config) -> str:
+    items = {
+        k: v for k, v in dataclasses.asdict(config).items() if k not in _NOT_IN_KEY
+    }
+    return json.dumps(items, sort_keys=True, default=str)
+
 
 def load_configuration(
     path: str,
@@ -454,6 +708,8 @@ def gen_main(
     narrative,
     fail_early: bool,
     fail_unseen_error: bool,
+    jobs: int = 1,
+    incremental: Optional[bool] = None,
 ) -> None:
     """
     Main entry point to generate docbundle files,
@@ -489,6 +745,11 @@ def gen_main(
         overwrite early_error option in config file
     fail_unseen_error : bool
         raise an exception if the error is unseen
+    jobs : int
+        number of processes to process API docstrings with
+    incremental : bool | None
+        CLI override of whether to reuse unchanged objects of the previous
+        bundle
 
     Returns
     -------
@@ -503,6 +764,8 @@ def gen_main(
         config.exec = exec_
     if infer is not None:
         config.infer = infer
+    if incremental is not None:
+        config.incremental = incremental
 
     target_dir = Path("~/.papyri/data").expanduser()
 
@@ -523,14 +786,22 @@ def gen_main(
         relative_dir=Path(target_file).parent,
         meta=meta,
     )
-    if examples:
-        g.collect_examples_out()
-    if api:
-        g.collect_api_docs(target_module_name)
-    if narrative:
-        g.collect_narrative_docs()
-
     p = target_dir / (g.root + "_" + g.version)
+    if config.incremental:
+        g.load_manifest(p)
+    import_cache.clear()
+    try:
+        if examples:
+            g.collect_examples_out()
+        if api:
+            g.collect_api_docs(target_module_name, jobs=jobs)
+        if narrative:
+            g.collect_narrative_docs()
+    finally:
+        jedi_cache.flush()
+    g.log.debug("import cache: %s", import_cache.stats())
+    g.log.debug("jedi cache: %s", jedi_cache.stats())
+
     p.mkdir(exist_ok=True)
 
     g.log.info("Saving current Doc bundle to %s", p)
@@ -540,6 +811,36 @@ def gen_main(
         temp_dir.cleanup()
 
 
+def _is_excluded(name: str, exclude: Sequence[str]) -> bool:
+    return any(name == e or name.startswith(e + ".") for e in exclude)
+
+
+def find_submodules(root: str, exclude: Sequence[str] = ()) -> List[str]:
+    """
+    Find the public submodules of the package `root` from its files, without
+    importing them.
+
+    Modules (and their submodules) listed in `exclude` are skipped, as well as
+    private ones.
+    """
+    spec = importlib.util.find_spec(root)
+    if spec is None or spec.submodule_search_locations is None:
+        return []
+    found = []
+    todo = deque([(list(spec.submodule_search_locations), root)])
+    while todo:
+        paths, package = todo.popleft()
+        for info in pkgutil.iter_modules(paths, package + "."):
+            *_, last = info.name.split(".")
+            if last.startswith("_") or _is_excluded(info.name, exclude):
+                continue
+            found.append(info.name)
+            # zip imports and other finders without a path are not walked.
+            if info.ispkg and (path := getattr(info.module_finder, "path", None)):
+                todo.append(([os.path.join(path, last)], info.name))
+    return found
+
+
 class DFSCollector:
     """
     Depth first search collector.
@@ -552,7 +853,7 @@ class DFSCollector:
 
     """
 
-    def __init__(self, root, others):
+    def __init__(self, root, others, submodules: Sequence[str] = ()):
         """
         Parameters
         ----------
@@ -565,13 +866,28 @@ class DFSCollector:
             Typically this is because some packages do not import some
             submodules by default, so we need to pass these submodules
             explicitly.
+        submodules
+            Names of modules to import once everything reachable from the
+            objects above has been visited, one at a time, each being
+            explored before the next one is imported (see `find_submodules`).
+            When given, modules are explored through their ``__dict__``
+            instead of ``dir()``, which would trigger lazy loaders.
         """
         assert isinstance(root, ModuleType), root
         self.root = root.__name__
         assert "." not in self.root
+        self.lazy = bool(submodules)
+        self._pending = deque(submodules)
+        # time taken to import each of the submodules that was not imported
+        # yet, and errors of those which could not be.
+        self.import_times: Dict[str, float] = {}
+        self.import_errors: Dict[str, str] = {}
         self.obj: Dict[str, Any] = dict()
-        self.aliases = defaultdict(lambda: [])
-        self._open_list = [(root, [root.__name__])]
+        # id of the objects in self.obj -> their qualified name; some objects
+        # (numpy arrays...) do not have bool values, or are costly to compare.
+        self._seen: Dict[int, str] = dict()
+        self.aliases: Dict[str, List[str]] = defaultdict(lambda: [])
+        self._open_list: Deque[Tuple[Any, List[str]]] = deque([(root, [root.__name__])])
         for o in others:
             self._open_list.append((o, o.__name__.split(".")))
 
@@ -579,13 +895,28 @@ class DFSCollector:
         """
         Attempt to find all objects.
         """
-        while len(self._open_list) >= 1:
-            current, stack = self._open_list.pop(0)
-
-            # numpy objects ane no bool values.
-            if id(current) not in [id(x) for x in self.obj.values()]:
+        while self._open_list or self._pending:
+            if not self._open_list:
+                name = self._pending.popleft()
+                if (mod := self._import(name)) is not None:
+                    self._open_list.append((mod, name.split(".")))
+                continue
+            current, stack = self._open_list.popleft()
+            if id(current) not in self._seen:
                 self.visit(current, stack)
 
+    def _import(self, name: str) -> Optional[ModuleType]:
+        if name in sys.modules:
+            return sys.modules[name]
+        start = time.perf_counter()
+        try:
+            mod = importlib.import_module(name)
+        except Exception as e:
+            self.import_errors[name] = f"{type(e).__name__}: {e}"
+            return None
+        self.import_times[name] = time.perf_counter() - start
+        return mod
+
     def prune(self) -> None:
         """
         Some object can be reached many times via multiple path.
@@ -631,11 +962,13 @@ class DFSCollector:
             return
         if not qa.split(".")[0] == self.root:
             return
-        if obj in self.obj.values():
+        if id(obj) in self._seen:
             return
-        if (qa in self.obj) and self.obj[qa] != obj:
-            pass
+        if qa in self.obj:
+            # another object with the same qualified name, that we replace.
+            del self._seen[id(self.obj[qa])]
         self.obj[qa] = obj
+        self._seen[id(obj)] = qa
         self.aliases[qa].append(".".join(stack))
 
         if isinstance(obj, ModuleType):
@@ -648,6 +981,10 @@ class DFSCollector:
             pass
 
     def visit_ModuleType(self, mod, stack):
+        if self.lazy:
+            for k, v in vars(mod).items():
+                self._open_list.append((v, stack + [k]))
+            return
         for k in dir(mod):
             # TODO: scipy 1.8 workaround, remove.
             if not hasattr(mod, k):
@@ -980,6 +1317,46 @@ class Gen:
         self.examples = {}
         self.docs = {}
         self._doctree = {}
+        self._sandbox: Optional[Sandbox] = None
+        # qualname -> key and figures of the API objects, see load_manifest.
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[str, str] = {}
+        self._file_hashes: Dict[str, Optional[str]] = {}
+        self._previous: Optional[Tuple[Path, Dict[str, Dict[str, Any]]]] = None
+
+    def _executor(
+        self,
+        ns: Dict[str, Any],
+        config: Config,
+        qa: str,
+        paths: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Executor for code blocks of `qa` in `ns`, in the sandbox process if
+        configured or there are limits, and `ns` can be imported there, see
+        `_namespace_spec` for `paths`.
+
+        Returns None if there are limits and `ns` can't be imported in the
+        sandbox: the limits are only enforced there, and the code should not
+        be executed.
+        """
+        timeout, memory_limit = config.exec_limits_for(qa)
+        limited = timeout is not None or memory_limit is not None
+        if config.exec_sandbox or limited:
+            ns_spec = _namespace_spec(ns, paths)
+            if ns_spec is not None:
+                if self._sandbox is None:
+                    self._sandbox = Sandbox()
+                return self._sandbox.executor(
+                    ns_spec, timeout=timeout, memory_limit=memory_limit
+                )
+            if limited:
+                self.log.warning(
+                    "Can't execute examples of %s in sandbox, not executing them", qa
+                )
+                return None
+            self.log.warning("Can't execute examples of %s in sandbox", qa)
+        return BlockExecutor(ns)
 
     def get_example_data(
         self, example_section, *, obj, qa: str, config, log
@@ -1069,7 +1446,10 @@ class Gen:
         ns.update(_get_implied_imports(obj))
         for k, v in config.implied_imports.items():
             ns[k] = obj_from_qualname(v)
-        executor = BlockExecutor(ns)
+        executor = self._executor(ns, config, qa, {obj.__name__: qa})
+        if executor is None:
+            config = config.replace(exec=False)
+            executor = BlockExecutor(ns)
         all_figs = []
         # fig_managers = _pylab_helpers.Gcf.get_all_fig_managers()
         fig_managers = executor.fig_man()
@@ -1079,6 +1459,18 @@ class Gen:
             config = config.replace(infer=False)
             log.debug(f"Turning off type inference for func {qa!r}")
         chunks = (it for block in blocks for it in block)
+        session = JediSession(
+            "".join(
+                "\n" + "\n".join(it.in_)
+                for block in blocks
+                for it in block
+                if isinstance(it, InOut)
+            ),
+            ns,
+        )
+        # once a block goes over the limits, the following ones are not
+        # executed, they likely depend on it.
+        over_limits = False
         with executor:
             for item in chunks:
                 figs = []
@@ -1089,7 +1481,11 @@ class Gen:
                 script, out, ce_status = _execute_inout(item)
                 raise_in_fig = None
                 did_except = False
-                if config.exec and ce_status == ExecutionStatus.compiled.value:
+                if (
+                    config.exec
+                    and ce_status == ExecutionStatus.compiled.value
+                    and not over_limits
+                ):
                     if not wait_for_show:
                         # we should aways have 0 figures
                         # unless stated otherwise
@@ -1099,6 +1495,14 @@ class Gen:
                         try:
                             res, fig_managers, sout, serr = executor.exec(script)
                             ce_status = "execed"
+                        except (ExecutionTimeoutError, ExecutionMemoryError) as e:
+                            log.warning("%s, in %s: %s", type(e).__name__, qa, script)
+                            if isinstance(e, ExecutionTimeoutError):
+                                ce_status = ExecutionStatus.timeout.value
+                            else:
+                                ce_status = ExecutionStatus.memory_limit.value
+                            over_limits = True
+                            fig_managers = executor.fig_man()
                         except Exception:
                             if "Traceback" not in "\n".join(out):
                                 log.exception("error in execution: %s", qa)
@@ -1111,7 +1515,7 @@ class Gen:
                             raise_in_fig = True
                             for fig, figname in zip(executor.get_figs(), figure_names):
                                 figs.append((figname, fig))
-                            plt.close("all")
+                            executor.close_figs()
                             raise_in_fig = False
 
                     except Exception:
@@ -1130,7 +1534,7 @@ class Gen:
                                     print(
                                         f"Still fig manager(s) open for {qa}: {figname}"
                                     )
-                                plt.close("all")
+                                executor.close_figs()
                             fig_managers = executor.fig_man()
                             assert len(fig_managers) == 0, fig_managers + [
                                 did_except,
@@ -1142,7 +1546,9 @@ class Gen:
                     else:
                         pass
                         # captured output differ TBD
-                entries = parse_script(script, ns=ns, prev=acc, config=config, where=qa)
+                entries = parse_script(
+                    script, ns=ns, prev=acc, config=config, where=qa, session=session
+                )
                 if entries is None:
                     entries = [("jedi failed", "jedi failed")]
                 entries = _add_classes(entries)
@@ -1162,7 +1568,7 @@ class Gen:
         fig_managers = executor.fig_man()
         if len(fig_managers) != 0:
             print(f"Unclosed figures in {qa}!!")
-            plt.close("all")
+            executor.close_figs()
 
         return processed_example_data(example_section_data), all_figs
 
@@ -1190,6 +1596,8 @@ class Gen:
             (where / "assets").rmdir()
         if (where / "papyri.json").exists():
             (where / "papyri.json").unlink()
+        if (where / "manifest.json").exists():
+            (where / "manifest.json").unlink()
         if (where / "docs").exists():
             (where / "docs").rmdir()
 
@@ -1294,6 +1702,27 @@ class Gen:
         with (where / "papyri.json").open("w") as f:
             assert "version" in self._meta
             f.write(json.dumps(self._meta, indent=2, sort_keys=True))
+        if self.config.incremental:
+            (where / "manifest.json").write_text(
+                json.dumps(self.manifest, indent=2, sort_keys=True)
+            )
+
+    def load_manifest(self, where: Path) -> None:
+        """
+        Load the manifest of the bundle in `where`, if any, to reuse the
+        objects that did not change since it was generated.
+
+        The manifest maps the qualified name of each API object to a key
+        (see `_api_object_key`) and the names of its figures.
+        """
+        path = where / "manifest.json"
+        if not path.exists():
+            self.log.info("No previous bundle in %s, generating everything", where)
+            return
+        try:
+            self._previous = (where, json.loads(path.read_text()))
+        except ValueError:
+            self.log.warning("Could not read %s, generating everything", path)
 
     def write_assets(self, where: Path) -> None:
         assets = where / "assets"
@@ -1574,7 +2003,9 @@ class Gen:
             for example in examples:
                 p2.update(taskp, description=compress_user(str(example)).ljust(7))
                 p2.advance(taskp)
-                executor = BlockExecutor({})
+                executor = self._executor({}, config, example.name)
+                # an empty namespace can always be sent to the sandbox.
+                assert executor is not None
                 script = example.read_text()
                 ce_status = "None"
                 figs = []
@@ -1587,6 +2018,12 @@ class Gen:
                                 for i, f in enumerate(executor.get_figs())
                             ]
                             ce_status = "execed"
+                        except ExecutionTimeoutError:
+                            self.log.warning("%s timed out", example)
+                            ce_status = ExecutionStatus.timeout.value
+                        except ExecutionMemoryError:
+                            self.log.warning("%s went over memory limit", example)
+                            ce_status = ExecutionStatus.memory_limit.value
                         except Exception as e:
                             failed.append(str(example))
                             if config.exec_failure == "fallback":
@@ -1650,26 +2087,56 @@ class Gen:
         the objects it can.
 
         We give it the root module, and a few submodules as seed.
+
+        With ``discover_submodules``, the other submodules of the root package
+        are found without importing them, and imported by the collector when
+        it gets to them, excluded ones never are.
         """
         assert "." not in self.root
+        import_times = {}
+        start = time.perf_counter()
         n0 = __import__(self.root)
+        import_times[self.root] = time.perf_counter() - start
         submodules = []
 
         subs = self.config.submodules
         extra_from_conf = [self.root + "." + s for s in subs]
         for name in extra_from_conf:
+            if _is_excluded(name, self.config.exclude):
+                continue
             _, *r = name.split(".")
+            start = time.perf_counter()
             nx = __import__(name)
+            import_times[name] = time.perf_counter() - start
             for sub in r:
                 nx = getattr(nx, sub)
             submodules.append(nx)
 
+        discovered = []
+        if self.config.discover_submodules:
+            discovered = find_submodules(self.root, self.config.exclude)
+            self.log.debug("Found %s submodules of %r", len(discovered), self.root)
+
         self.log.debug(
             "Collecting API starting from [%r], and %s",
             n0.__name__,
             [m.__name__ for m in submodules],
         )
-        return DFSCollector(n0, submodules)
+        collector = DFSCollector(n0, submodules, discovered)
+        collector.import_times.update(import_times)
+        return collector
+
+    def _log_imports(self, collector: DFSCollector) -> None:
+        for name, error in collector.import_errors.items():
+            self.log.warning("Could not import %s, skipping it: %s", name, error)
+        times = sorted(collector.import_times.items(), key=lambda x: -x[1])
+        self.log.info(
+            "Imported %s modules in %.2fs",
+            len(times),
+            sum(t for _, t in times),
+        )
+        for name, t in times:
+            self.log.debug("  %.3fs %s", t, name)
 
     def collect_examples_out(self):
 
@@ -1756,10 +2223,236 @@ class Gen:
         self._meta.update({"logo": logo, "module": root, "version": self.version})
         self._meta.update(meta)
 
-    def collect_api_docs(
+    def _put_api_object(self, qa: str, doc_blob, figs, links) -> None:
+        self.put(qa, doc_blob)
+        for name, data in figs:
+            self.put_raw(name, data)
+        if qa in self._keys:
+            self.manifest[qa] = {
+                "key": self._keys[qa],
+                "figures": [name for name, _ in figs],
+                "links": links,
+            }
+
+    def _file_hash(self, path: Optional[str]) -> Optional[str]:
+        if path is None:
+            return None
+        if path not in self._file_hashes:
+            try:
+                self._file_hashes[path] = sha256(Path(path).read_bytes()).hexdigest()
+            except OSError:
+                self._file_hashes[path] = None
+        return self._file_hashes[path]
+
+    def _api_object_key(
+        self, qa: str, target_item: Any, aliases: List[str], base: str
+    ) -> str:
+        """
+        Key of what the DocBlob and figures of `qa` are generated from: its
+        docstring, signature, aliases, the content of its source file, and
+        `base`, the key of everything shared by all objects. What it links to
+        is checked separately, see `_reuse_api_object`.
+        """
+        try:
+            # default values without a repr would change the key every run.
+            signature = re.sub(
+                r" at 0x[0-9a-f]+>", ">", str(inspect.signature(target_item))
+            )
+        except (TypeError, ValueError):
+            signature = None
+        try:
+            source = inspect.getsourcefile(target_item)
+        except TypeError:
+            source = None
+        doc = getattr(target_item, "__doc__", None)
+        data = [base, qa, doc, signature, aliases, source, self._file_hash(source)]
+        return sha256(json.dumps(data, default=str).encode()).hexdigest()
+
+    def _reuse_api_object(
         self,
-        root: str,
-    ):
+        qa: str,
+        known_refs: FrozenSet[RefInfo],
+        rev_aliases: Dict[Cannonical, FullQual],
+    ) -> Optional[Tuple[DocBlob, List, List]]:
+        """
+        DocBlob, figures and links of `qa` in the previous bundle, if its key
+        did not change, and the references it resolved still resolve to the
+        same objects among `known_refs`.
+
+        Adding or removing objects thus only regenerates the objects whose
+        links change.
+        """
+        if self._previous is None:
+            return None
+        where, manifest = self._previous
+        entry = manifest.get(qa)
+        if entry is None or entry["key"] != self._keys[qa]:
+            return None
+        for *link, res in entry["links"]:
+            if _resolve_link(qa, link, known_refs, rev_aliases) != res:
+                return None
+        try:
+            doc_blob = DocBlob.from_json((where / "module" / f"{qa}.json").read_bytes())
+            figs = [(n, (where / "assets" / n).read_bytes()) for n in entry["figures"]]
+        except Exception:
+            self.log.debug("Could not reuse %s from the previous bundle", qa)
+            return None
+        return doc_blob, figs, entry["links"]
+
+    def _process_api_object(
+        self,
+        qa: str,
+        target_item: Any,
+        aliases: List[str],
+        known_refs: FrozenSet[RefInfo],
+        rev_aliases: Dict[Cannonical, FullQual],
+        error_collector,
+        failure_collection: Dict[str, List[str]],
+    ) -> Optional[Tuple[DocBlob, List, List]]:
+        """
+        Parse, process and resolve the docstring of one object collected by
+        `collect_api_docs`.
+
+        Returns
+        -------
+        None if the object failed to be processed, otherwise the DocBlob,
+        figures, and links for this object: the ``(kind, local refs, name,
+        result)`` of each reference resolved against `known_refs`, see
+        `_resolve_link`.
+        """
+        with error_collector(qa=qa) as c:
+            item_docstring, arbitrary, api_object = self.helper_1(
+                qa=qa,
+                target_item=target_item,
+            )
+        if c.errored:
+            return None
+        assert api_object is not None, c.errored
+
+        try:
+            if item_docstring is None:
+                ndoc = NumpyDocString(dedent_but_first("No Docstrings"))
+            else:
+                ndoc = NumpyDocString(dedent_but_first(item_docstring))
+                # note currentlu in ndoc we use:
+                # _parsed_data
+                # direct access to  ["See Also"], and [""]
+                # and :
+                # ndoc.ordered_sections
+        except Exception as e:
+            if not isinstance(target_item, ModuleType):
+                self.log.exception(
+                    "Unexpected error parsing %s – %s",
+                    qa,
+                    target_item.__name__,
+                )
+                failure_collection["NumpydocError-" + str(type(e))].append(qa)
+            if isinstance(target_item, ModuleType):
+                # TODO: ndoc-placeholder : remove placeholder here
+                ndoc = NumpyDocString(f"To remove in the future –– {qa}")
+            else:
+                return None
+        if not isinstance(target_item, ModuleType):
+            arbitrary = []
+        ex = self.config.exec
+        if self.config.exec and any(
+            qa.startswith(pat) for pat in self.config.execute_exclude_patterns
+        ):
+            ex = False
+
+        # TODO: ndoc-placeholder : make sure ndoc placeholder handled here.
+        assert api_object is not None
+        with error_collector(qa=qa) as c:
+            doc_blob, figs = self.prepare_doc_for_one_object(
+                target_item,
+                ndoc,
+                qa=qa,
+                config=self.config.replace(exec=ex),
+                aliases=aliases,
+                api_object=api_object,
+            )
+        if c.errored:
+            return None
+        _local_refs: List[str] = []
+
+        sections_ = [
+            "Parameters",
+            "Returns",
+            "Raises",
+            "Yields",
+            "Attributes",
+            "Other Parameters",
+            "Warns",
+            ##"Warnings",
+            "Methods",
+            # "Summary",
+            "Receives",
+        ]
+        for s in sections_:
+            for child in doc_blob.content.get(s, []):
+                if isinstance(child, Parameters):
+                    for param in child.children:
+                        new_ref = [u.strip() for u in param[0].split(",") if u]
+                        if new_ref:
+                            _local_refs = _local_refs + new_ref
+
+        # def flat(l) -> List[str]:
+        #    return [y for x in l for y in x]
+        for lr1 in _local_refs:
+            assert isinstance(lr1, str)
+        # lr: FrozenSet[str] = frozenset(flat(_local_refs))
+        lr: FrozenSet[str] = frozenset(_local_refs)
+        dv = _RecordingDVR(
+            qa, known_refs, local_refs=lr, aliases={}, version=self.version
+        )
+        doc_blob.arbitrary = [dv.visit(s) for s in arbitrary]
+        doc_blob.example_section_data = dv.visit(doc_blob.example_section_data)
+
+        for section in ["Extended Summary", "Summary", "Notes"] + sections_:
+            if section in doc_blob.content:
+                doc_blob.content[section] = dv.visit(doc_blob.content[section])
+
+        links = [[*link, res] for link, res in dv.links.items()]
+        for sa in doc_blob.see_also:
+            r = resolve_(
+                qa,
+                known_refs,
+                frozenset(),
+                sa.name.value,
+                rev_aliases=rev_aliases,
+            )
+            assert isinstance(r, RefInfo)
+            links.append(["see-also", (), sa.name.value, list(r)])
+            if r.kind == "module":
+                sa.name.reference = r
+            else:
+                imp = DVR._import_solver(sa.name.value)
+                if imp:
+                    self.log.debug(
+                        "TODO: see also resolve for %s in %s, %s",
+                        sa.name.value,
+                        qa,
+                        imp,
+                    )
+
+        # eg, dask: str, dask.array.gufunc.apply_gufun: List[str]
+        assert isinstance(doc_blob.references, (list, str, type(None))), (
+            repr(doc_blob.references),
+            qa,
+        )
+
+        if isinstance(doc_blob.references, str):
+            print(repr(doc_blob.references))
+        doc_blob.references = None
+
+        # end processing
+        try:
+            doc_blob.validate()
+        except Exception as e:
+            raise type(e)(f"Error in {qa}")
+        return doc_blob, figs, links
+
+    def collect_api_docs(self, root: str, *, jobs: int = 1):
         """
         Crawl one module and stores resulting docbundle in self.store.
 
@@ -1767,6 +2460,11 @@ class Gen:
         ----------
         root : str
             module name to generate docbundle for.
+        jobs : int
+            number of processes to process the docstrings with, the results
+            are stored in the same order, and errors handled the same way, as
+            with a single process. Workers are forked, so this is ignored on
+            Windows.
 
         See Also
         --------
@@ -1776,6 +2474,7 @@ class Gen:
 
         collector: DFSCollector = self._get_collector()
         collected: Dict[str, Any] = collector.items()
+        self._log_imports(collector)
 
         # collect all items we want to document.
         excluded = sorted(self.config.exclude)
@@ -1802,151 +2501,87 @@ class Gen:
             {RefInfo(root, self.version, "module", qa) for qa in collected.keys()}
         )
 
-        error_collector = ErrorCollector(self.config, self.log)
-        with self.progress() as p2:
-
-            # just nice display of progression.
-            taskp = p2.add_task(description="parsing", total=len(collected))
-
-            failure_collection: Dict[str, List[str]] = defaultdict(lambda: [])
-
+        reused = {}
+        if self.config.incremental:
+            base = json.dumps(
+                [environment_key(), _config_key(self.config), self.version]
+            )
             for qa, target_item in collected.items():
-                p2.update(taskp, description=qa)
-                p2.advance(taskp)
+                self._keys[qa] = self._api_object_key(
+                    qa, target_item, collector.aliases[qa], base
+                )
+                res = self._reuse_api_object(qa, known_refs, rev_aliases)
+                if res is not None:
+                    reused[qa] = res
+            self.log.info(
+                "Reusing %s of %s objects from the previous bundle",
+                len(reused),
+                len(collected),
+            )
+        for qa, res in reused.items():
+            self._put_api_object(qa, *res)
+        todo = [qa for qa in collected if qa not in reused]
 
-                with error_collector(qa=qa) as c:
-                    item_docstring, arbitrary, api_object = self.helper_1(
-                        qa=qa,
-                        target_item=target_item,
-                    )
-                if c.errored:
-                    continue
-                assert api_object is not None, c.errored
+        if jobs > 1 and sys.platform == "win32":
+            self.log.warning("Workers are forked, ignoring jobs=%s on Windows", jobs)
+            jobs = 1
 
-                try:
-                    if item_docstring is None:
-                        ndoc = NumpyDocString(dedent_but_first("No Docstrings"))
-                    else:
-                        ndoc = NumpyDocString(dedent_but_first(item_docstring))
-                        # note currentlu in ndoc we use:
-                        # _parsed_data
-                        # direct access to  ["See Also"], and [""]
-                        # and :
-                        # ndoc.ordered_sections
-                except Exception as e:
-                    if not isinstance(target_item, ModuleType):
-                        self.log.exception(
-                            "Unexpected error parsing %s – %s",
-                            qa,
-                            target_item.__name__,
-                        )
-                        failure_collection["NumpydocError-" + str(type(e))].append(qa)
-                    if isinstance(target_item, ModuleType):
-                        # TODO: ndoc-placeholder : remove placeholder here
-                        ndoc = NumpyDocString(f"To remove in the future –– {qa}")
-                    else:
-                        continue
-                if not isinstance(target_item, ModuleType):
-                    arbitrary = []
-                ex = self.config.exec
-                if self.config.exec and any(
-                    qa.startswith(pat) for pat in self.config.execute_exclude_patterns
-                ):
-                    ex = False
-
-                # TODO: ndoc-placeholder : make sure ndoc placeholder handled here.
-                assert api_object is not None
-                with error_collector(qa=qa) as c:
-                    doc_blob, figs = self.prepare_doc_for_one_object(
-                        target_item,
-                        ndoc,
-                        qa=qa,
-                        config=self.config.replace(exec=ex),
-                        aliases=collector.aliases[qa],
-                        api_object=api_object,
+        error_collector = ErrorCollector(self.config, self.log)
+        with ExitStack() as stack:
+            pool = None
+            if jobs > 1 and len(todo) > 1:
+                # only send back what the workers import.
+                import_cache.take_new()
+                # objects can't be pickled, so workers are forked (before the
+                # progress bar starts its thread) and look them up by name.
+                args = (self, collected, collector.aliases, known_refs, rev_aliases)
+                pool = stack.enter_context(
+                    multiprocessing.pool.Pool(
+                        jobs,
+                        initializer=init_worker,
+                        initargs=args,
+                        context=_WorkerContext(),
                     )
-                if c.errored:
-                    continue
-                _local_refs: List[str] = []
-
-                sections_ = [
-                    "Parameters",
-                    "Returns",
-                    "Raises",
-                    "Yields",
-                    "Attributes",
-                    "Other Parameters",
-                    "Warns",
-                    ##"Warnings",
-                    "Methods",
-                    # "Summary",
-                    "Receives",
-                ]
-                for s in sections_:
-                    for child in doc_blob.content.get(s, []):
-                        if isinstance(child, Parameters):
-                            for param in child.children:
-                                new_ref = [u.strip() for u in param[0].split(",") if u]
-                                if new_ref:
-                                    _local_refs = _local_refs + new_ref
-
-                # def flat(l) -> List[str]:
-                #    return [y for x in l for y in x]
-                for lr1 in _local_refs:
-                    assert isinstance(lr1, str)
-                # lr: FrozenSet[str] = frozenset(flat(_local_refs))
-                lr: FrozenSet[str] = frozenset(_local_refs)
-                dv = DVR(
-                    qa, known_refs, local_refs=lr, aliases={}, version=self.version
                 )
-                doc_blob.arbitrary = [dv.visit(s) for s in arbitrary]
-                doc_blob.example_section_data = dv.visit(doc_blob.example_section_data)
+            p2 = stack.enter_context(self.progress())
 
-                for section in ["Extended Summary", "Summary", "Notes"] + sections_:
-                    if section in doc_blob.content:
-                        doc_blob.content[section] = dv.visit(doc_blob.content[section])
+            # just nice display of progression.
+            taskp = p2.add_task(description="parsing", total=len(todo))
 
-                for sa in doc_blob.see_also:
-                    from .tree import resolve_
+            failure_collection: Dict[str, List[str]] = defaultdict(lambda: [])
 
-                    r = resolve_(
+            if pool is not None:
+                chunksize = max(1, min(16, len(todo) // (4 * jobs)))
+                results = pool.imap(_process_api_object_worker, todo, chunksize)
+                for qa, (res, outcomes, failures, imports) in zip(todo, results):
+                    p2.update(taskp, description=qa)
+                    p2.advance(taskp)
+                    # replay the errors in order, with the same outcome
+                    # as if they had been raised here.
+                    for eqa, exc in outcomes:
+                        with error_collector(qa=eqa):
+                            if exc is not None:
+                                raise exc
+                    for k, v in failures.items():
+                        failure_collection[k].extend(v)
+                    import_cache.update(imports)
+                    if res is not None:
+                        self._put_api_object(qa, *res)
+            else:
+                for qa in todo:
+                    p2.update(taskp, description=qa)
+                    p2.advance(taskp)
+                    res = self._process_api_object(
                         qa,
+                        collected[qa],
+                        collector.aliases[qa],
                         known_refs,
-                        frozenset(),
-                        sa.name.value,
-                        rev_aliases=rev_aliases,
+                        rev_aliases,
+                        error_collector,
+                        failure_collection,
                     )
-                    assert isinstance(r, RefInfo)
-                    if r.kind == "module":
-                        sa.name.reference = r
-                    else:
-                        imp = DVR._import_solver(sa.name.value)
-                        if imp:
-                            self.log.debug(
-                                "TODO: see also resolve for %s in %s, %s",
-                                sa.name.value,
-                                qa,
-                                imp,
-                            )
-
-                # eg, dask: str, dask.array.gufunc.apply_gufun: List[str]
-                assert isinstance(doc_blob.references, (list, str, type(None))), (
-                    repr(doc_blob.references),
-                    qa,
-                )
-
-                if isinstance(doc_blob.references, str):
-                    print(repr(doc_blob.references))
-                doc_blob.references = None
-
-                # end processing
-                try:
-                    doc_blob.validate()
-                except Exception as e:
-                    raise type(e)(f"Error in {qa}")
-                self.put(qa, doc_blob)
-                for name, data in figs:
-                    self.put_raw(name, data)
+                    if res is not None:
+                        self._put_api_object(qa, *res)
             if error_collector._errors:
                 self.log.info("ERRORS:" + toml.dumps(error_collector._errors))
             if error_collector._expected_unseen:
@@ -1,9 +1,32 @@
 # import json
+import hashlib
+import mmap
+import os
 import cbor2
 import sqlite3
-from collections import namedtuple
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from pathlib import Path as _Path
-from typing import List, Set
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    FrozenSet,
+    Tuple,
+    Type,
+    Union,
+    overload,
+)
+
+from .take2 import RefInfo
+from .utils import progress
 
 
 class Path:
@@ -74,6 +97,254 @@ class Path:
 Key = namedtuple("Key", ["module", "version", "kind", "path"])
 
 
+class Blobs:
+    """
+    Storage backend of the documents blobs of a `GraphStore`.
+
+    Blobs are addressed by a tuple of path components, which is a `Key` for
+    documents, and ``(module, version, "meta.cbor")`` for package metadata.
+    """
+
+    name: str
+
+    def __init__(self, root: _Path, conn: sqlite3.Connection):
+        pass
+
+    def get(self, parts) -> Union[bytes, memoryview]:
+        raise NotImplementedError
+
+    def put(self, parts, data: Union[bytes, memoryview]) -> None:
+        raise NotImplementedError
+
+    def exists(self, parts) -> bool:
+        raise NotImplementedError
+
+    def remove(self, parts) -> None:
+        raise NotImplementedError
+
+    def clear(self, all_parts) -> None:
+        """
+        Remove all the given blobs.
+        """
+        raise NotImplementedError
+
+
+class FileBlobs(Blobs):
+    """
+    Default blob storage, each document is its own file under
+    ``module/version/kind/path`` relative to the store root.
+    """
+
+    name = "files"
+
+    def __init__(self, root: _Path, conn: sqlite3.Connection):
+        self._root = root
+
+    def _path(self, parts) -> _Path:
+        assert None not in parts, parts
+        return self._root.joinpath(*parts)
+
+    # below this size a plain read is faster than mapping the file.
+    _MMAP_MIN_SIZE = 16 * 1024
+
+    def get(self, parts) -> Union[bytes, memoryview]:
+        """
+        Content of the blob, as a read-only memoryview over a mmap of the file
+        for large blobs.
+        """
+        with open(self._path(parts), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self._MMAP_MIN_SIZE:
+                return f.read()
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def put(self, parts, data: Union[bytes, memoryview]) -> None:
+        """
+        Write to a temporary file replacing the blob, instead of truncating
+        the blob in place, which would break the maps `get` handed out.
+        """
+        path = self._path(parts)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def exists(self, parts) -> bool:
+        return self._path(parts).exists()
+
+    def remove(self, parts) -> None:
+        self._path(parts).unlink()
+
+    def clear(self, all_parts) -> None:
+        """
+        Remove all the given blobs, and the directories left empty.
+        """
+        for parts in all_parts:
+            self.remove(parts)
+        for dirpath, _, _ in os.walk(self._root, topdown=False):
+            if _Path(dirpath) != self._root and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+
+class PackedBlobs(Blobs):
+    """
+    Blob storage in a single append-only pack file, ``blobs.pack``, with the
+    offset and length of each blob in the ``packed`` table of the store
+    database.
+
+    This avoids creating hundreds of thousands of small files when ingesting
+    many libraries. Overwritten or removed blobs are not reclaimed, migrate
+    back and forth to compact the pack file.
+    """
+
+    name = "packed"
+
+    def __init__(self, root: _Path, conn: sqlite3.Connection):
+        self.conn = conn
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS packed(
+            path TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL)
+            """
+        )
+        self._pack = root / "blobs.pack"
+        self._writer = open(self._pack, "ab", buffering=0)
+        self._reader = open(self._pack, "rb", buffering=0)
+        self._map: Optional[mmap.mmap] = None
+
+    def _view(self, offset: int, length: int) -> memoryview:
+        """
+        Read-only view of the pack file, remapping it if it grew since we last
+        mapped it. Views handed out earlier keep the previous map alive.
+        """
+        if self._map is None or len(self._map) < offset + length:
+            self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[offset : offset + length]
+
+    def _location(self, parts) -> Optional[Tuple[int, int]]:
+        assert None not in parts, parts
+        rows = list(
+            self.conn.execute(
+                "select offset, length from packed where path=?", ("/".join(parts),)
+            )
+        )
+        if not rows:
+            return None
+        [(offset, length)] = rows
+        return offset, length
+
+    def get(self, parts) -> memoryview:
+        """
+        Content of the blob, as a read-only memoryview over a mmap of the pack.
+        """
+        loc = self._location(parts)
+        if loc is None:
+            raise FileNotFoundError("/".join(parts))
+        offset, length = loc
+        if not length:
+            return memoryview(b"")
+        return self._view(offset, length)
+
+    def put(self, parts, data: Union[bytes, memoryview]) -> None:
+        assert None not in parts, parts
+        offset = self._writer.seek(0, os.SEEK_END)
+        self._writer.write(data)
+        self.conn.execute(
+            "insert or replace into packed values (?, ?, ?)",
+            ("/".join(parts), offset, len(data)),
+        )
+
+    def exists(self, parts) -> bool:
+        return self._location(parts) is not None
+
+    def remove(self, parts) -> None:
+        self.conn.execute("delete from packed where path=?", ("/".join(parts),))
+
+    def clear(self, all_parts) -> None:
+        """
+        Remove all the blobs, and the pack file.
+        """
+        self.conn.execute("delete from packed")
+        self._map = None
+        self._writer.close()
+        self._reader.close()
+        self._pack.unlink()
+
+
+BACKENDS: Dict[str, Type[Blobs]] = {b.name: b for b in [FileBlobs, PackedBlobs]}
+
+
+class DocumentCache:
+    """
+    Bounded LRU cache of decoded documents, keyed by blob parts.
+
+    The size of an entry is the length of its encoded blob, least recently
+    used entries are evicted once the total goes over ``max_size``.
+    Decoded objects are shared between all the callers and must not be
+    mutated.
+
+    None of the methods yield to the event loop, so concurrent trio tasks
+    (like in ``papyri serve``) can share a cache; the lock only matters for
+    callers that also use threads.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, parts, load: Callable[[], Any], decode: Callable[[Any], Any]):
+        """
+        Decoded document for `parts`, calling ``decode(load())`` on a miss.
+        """
+        parts = tuple(parts)
+        with self._lock:
+            if parts in self._entries:
+                self._entries.move_to_end(parts)
+                self.hits += 1
+                return self._entries[parts][0]
+            self.misses += 1
+            data = load()
+            obj = decode(data)
+            size = len(data)
+            if size <= self.max_size:
+                self._entries[parts] = (obj, size)
+                self._size += size
+                while self._size > self.max_size:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._size -= evicted
+            return obj
+
+    def invalidate(self, parts) -> None:
+        with self._lock:
+            entry = self._entries.pop(tuple(parts), None)
+            if entry is not None:
+                self._size -= entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "size": self._size,
+        }
+
+
 class GraphStore:
     """
     Class abstraction over the filesystem to store documents in a graph-like
@@ -115,12 +386,34 @@ class GraphStore:
 
     """
 
-    def __init__(self, root: _Path, link_finder=None):
+    def __init__(
+        self,
+        root: _Path,
+        link_finder=None,
+        *,
+        backend=None,
+        cache_size: int = 64 * 1024 * 1024,
+    ):
+        """
+        Parameters
+        ----------
+        root : Path
+            directory in which to store the documents and the database.
+        link_finder
+            unused
+        backend : str, optional
+            how to store the documents blobs, one of `BACKENDS`; defaults to
+            the one the store was created with, or ``"files"`` for a new
+            store. Use `migrate` to change the backend of an existing store.
+        cache_size : int
+            maximum total size, in bytes of encoded blobs, of the documents
+            kept by `get_decoded` and `get_meta_decoded`.
+        """
 
         # for now we are going to try to do in-memory operation, just to
         # see how we can handle that with SQL, and move to on-disk later.
-        p = _Path("~/.papyri/ingest/papyri.db")
-        p = p.expanduser()
+        assert isinstance(root, _Path)
+        p = root / "papyri.db"
         if not p.exists():
             self.conn = sqlite3.connect(str(p))
             self.conn.execute("PRAGMA foreign_keys = 1")
@@ -173,90 +466,384 @@ class GraphStore:
             self.conn.commit()
         else:
             self.conn = sqlite3.connect(str(p))
+            self.conn.execute("PRAGMA foreign_keys = 1")
+
+        # Indices added after the initial schema, so also created when opening
+        # an existing database.
+        for cid in [
+            "CREATE INDEX IF NOT EXISTS dax on documents(package, version, category, identifier);",
+            "CREATE INDEX IF NOT EXISTS cx on documents(category, identifier);",
+        ]:
+            self.conn.cursor().execute(cid)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS settings(name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        # sha256 of the content of assets, which are stored once per content
+        # (see `_content_parts`), and of the sources of other documents, to
+        # skip the unchanged ones when re-ingesting.
+        columns = {r[1] for r in self.conn.execute("PRAGMA table_info(documents)")}
+        if "hash" not in columns:
+            self.conn.execute("ALTER TABLE documents ADD COLUMN hash TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS hx on documents(hash)")
+        # names documents refer to that could not be resolved, and the
+        # references known at the last relink, see `put_unresolved` and
+        # `set_relinked_refs`.
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS unresolved(
+            source INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            unique(source, kind, name),
+            FOREIGN KEY (source) REFERENCES documents(id) ON DELETE CASCADE)
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ux on unresolved(name)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS relinked(
+            package TEXT NOT NULL,
+            version TEXT NOT NULL,
+            category TEXT NOT NULL,
+            identifier TEXT NOT NULL)
+            """
+        )
+        self.conn.commit()
 
         # assert isinstance(link_finder, dict)
-        assert isinstance(root, _Path)
         self._root = Path(root)
         self._link_finder = link_finder
 
-    def _key_to_path(self, key: Key) -> Path:
+        recorded = self._get_setting("backend")
+        if backend is None:
+            backend = recorded or FileBlobs.name
+        elif recorded is not None and recorded != backend:
+            raise ValueError(
+                f"The store in {root} uses the {recorded!r} backend, "
+                f"migrate it before using it with {backend!r}."
+            )
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend!r}, use one of {list(BACKENDS)}"
+            )
+        self._blobs: Blobs = BACKENDS[backend](root, self.conn)
+        if recorded is None:
+            self._set_setting("backend", backend)
+            self.conn.commit()
+        # nesting depth of `batch()`, when non zero we do not commit after
+        # each put, but only once the outermost batch exits.
+        self._batch_depth = 0
+        self.cache = DocumentCache(cache_size)
+        # (generation, known refs, ref map), see `known_refs`.
+        self._known_refs: Optional[Tuple[int, FrozenSet[RefInfo], Dict[str, RefInfo]]]
+        self._known_refs = None
+
+    @contextmanager
+    def batch(self):
         """
-        Given A key, return path to the current file
-        and the back referenced.
+        Group all the writes done in the block in a single transaction.
 
-        Parameters
-        ----------
-        key : Key
+        Ingesting a library does tens of thousands of `put`, committing each of
+        them separately is what dominate ingestion time. Batches can be nested,
+        only the outermost one commits (or rollback on error).
 
-        Returns
-        -------
-        data_path:  _Path
-        backref_path : _Path
+        Examples
+        --------
+        >>> with store.batch():  # doctest: +SKIP
+        ...     for key, data, refs in items:
+        ...         store.put(key, data, refs)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.rollback()
+                self.cache.clear()
+                # the generation is rolled back too, and will be reused.
+                self._known_refs = None
+            raise
+        else:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.commit()
 
+    @contextmanager
+    def _transaction(self):
         """
-        path = self._root
-        assert None not in key, key
-        for k in key[:-1]:
-            path = path / k
-        path0 = path / (key[-1])
-        return path0
+        Context manager that commits on exit unless we are inside a `batch()`.
+        """
+        if self._batch_depth:
+            yield
+        else:
+            with self.conn:
+                yield
 
-    def _path_to_key(self, path: Path):
+    def _get_setting(self, name: str) -> Optional[str]:
+        rows = list(
+            self.conn.execute("select value from settings where name=?", (name,))
+        )
+        if not rows:
+            return None
+        [(value,)] = rows
+        return value
+
+    def _set_setting(self, name: str, value: str) -> None:
+        self.conn.execute(
+            "insert or replace into settings values (?, ?)", (name, value)
+        )
+
+    @property
+    def backend(self) -> str:
+        return self._blobs.name
+
+    @property
+    def generation(self) -> int:
         """
-        Given a path, return the key for the document.
+        Number incremented each time a module document is added or removed.
 
-        Opposite of _key_to_path
+        It is stored in the database, so other processes writing to the same
+        store also invalidate our `known_refs`.
+        """
+        return int(self._get_setting("generation") or 0)
 
-        Parameters
-        ----------
-        path : Path
+    def _bump_generation(self) -> None:
+        self._set_setting("generation", str(self.generation + 1))
+
+    def known_refs(self) -> Tuple[FrozenSet[RefInfo], Dict[str, RefInfo]]:
+        """
+        All the module documents we can link to.
+
+        This is a snapshot only rebuilt when `generation` changes; the same
+        frozenset object is returned until then, so its hash is only computed
+        once and resolver caches keyed on it can be reused.
 
         Returns
         -------
-        key : Key
+        known_refs : frozenset of RefInfo
+        ref_map : dict
+            from path to RefInfo, when several versions of a module are
+            stored, one of them. Shared, do not mutate.
         """
-        path = path.relative_to(self._root.path)
-        if len(path.parts) == 4:
-            a, b, c, d = path.parts
-            return Key(a, b, c, d)
-        else:
-            return path.parts
+        generation = self.generation
+        if self._known_refs is None or self._known_refs[0] != generation:
+            refs = [
+                RefInfo(k.module, k.version, "module", k.path)
+                for k in sorted(self.glob((None, None, "module", None)))
+            ]
+            ref_map = {r.path: r for r in refs}
+            self._known_refs = (generation, frozenset(refs), ref_map)
+        return self._known_refs[1], self._known_refs[2]
+
+    def migrate(self, backend: str) -> None:
+        """
+        Move all the stored blobs to another storage backend.
+
+        The blobs are copied, the new backend is recorded in the database,
+        and only then are the blobs removed from the old backend.
+
+        Parameters
+        ----------
+        backend : str
+            one of `BACKENDS`.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend!r}, use one of {list(BACKENDS)}"
+            )
+        old = self._blobs
+        if backend == old.name:
+            return
+        new = BACKENDS[backend](self._root.path, self.conn)
+        all_parts = [
+            tuple(self._blob_parts(k)) for k in self.glob((None, None, None, None))
+        ]
+        # metadata put before it was recorded in the documents table.
+        all_parts.extend(
+            m
+            for m in (
+                self._meta_parts(module, version)
+                for module, version in self.glob((None, None))
+            )
+            if old.exists(m)
+        )
+        all_parts = list(dict.fromkeys(all_parts))
+        with self.batch():
+            for _, parts in progress(
+                all_parts, description=f"Moving to {backend} backend..."
+            ):
+                new.put(parts, old.get(parts))
+            self._set_setting("backend", backend)
+        old.clear(all_parts)
+        self._blobs = new
 
     def remove(self, key: Key) -> None:
-        path = self._key_to_path(key)
-        path.unlink()
+        digest = self.get_hash(key) if key.kind == "assets" else None
+        if digest is None:
+            self._blobs.remove(self._blob_parts(key))
+        self.cache.invalidate(key)
         #  this is likely incorrect if we want to deal with dangling links.
         print("Removing link from table")
-        self.conn.execute(
-            "delete from links where source=?",
-            (str(key),),
-        )
+        with self._transaction():
+            for table in ["links", "unresolved"]:
+                self.conn.execute(
+                    f"""
+                    delete from {table} where source in (
+                        select id from documents where (
+                            package=?
+                        AND version=?
+                        AND category=?
+                        AND identifier=?))
+                    """,
+                    list(key),
+                )
+            self.conn.execute(
+                """
+                delete from documents where (
+                    package=?
+                AND version=?
+                AND category=?
+                AND identifier=?)
+                """,
+                list(key),
+            )
+            if digest is not None:
+                self._release_content(digest)
+            if key.kind == "module":
+                self._bump_generation()
 
-    def _get(self, key: Key) -> bytes:
-        assert isinstance(key, Key)
-        path = self._key_to_path(key)
+    def _content_parts(self, digest: str) -> Tuple[str, str, str]:
+        """
+        Blob parts of content addressed assets.
 
-        # TODO: this is partially incorrect.
-        # as we only match on the identifier,
-        # we should match on more.
-        return path.read_bytes()
+        ``.assets`` cannot be a package name, so this does not collide with
+        documents keys.
+        """
+        return (".assets", digest[:2], digest)
 
-    def _get_backrefs(self, key: Key) -> Set[Key]:
-        cur = self.conn.cursor()
-        backrows = list(
-            cur.execute(
+    def _blob_parts(self, key: Key):
+        """
+        Where the blob of ``key`` is stored in the backend.
+
+        Assets are stored once per content, the documents table maps each
+        asset key to the hash of its content. Stores ingested before that
+        have the assets under their key. The metadata of a package is stored
+        next to its documents, see `put_meta`.
+        """
+        if key.kind == "assets":
+            digest = self.get_hash(key)
+            if digest is not None:
+                return self._content_parts(digest)
+        if key == self._meta_key(key.module, key.version):
+            return self._meta_parts(key.module, key.version)
+        return key
+
+    def _release_content(self, digest: str) -> None:
+        """
+        Remove the content addressed blob ``digest`` if no asset uses it.
+        """
+        rows = self.conn.execute(
+            "select 1 from documents where category='assets' and hash=? limit 1",
+            (digest,),
+        )
+        if not list(rows):
+            self._blobs.remove(self._content_parts(digest))
+
+    def get_hash(self, key: Key) -> Optional[str]:
+        """
+        sha256 hex digest of the content of an asset, or the source hash given
+        when putting another kind of document; None if there is none.
+        """
+        rows = list(
+            self.conn.execute(
                 """
-        select documents.*
-        from links
-            inner join documents on links.source=documents.id
-            inner join destinations on links.dest=destinations.id
-        where destinations.identifier=?""",
-                (key.path,),
+                select hash from documents where (
+                    package=?
+                AND version=?
+                AND category=?
+                AND identifier=?)
+                """,
+                list(key),
             )
         )
+        if not rows:
+            return None
+        [(digest,)] = rows
+        return digest
 
-        sql_backrefs = {Key(*s[1:]) for s in backrows}
-        return sql_backrefs
+    def get_hashes(self, module: str, version: str, kind: str) -> Dict[str, str]:
+        """
+        Bulk version of `get_hash`, for all the documents of a given kind.
+
+        Returns
+        -------
+        dict
+            mapping from document path to hash, documents without hash are
+            omitted.
+        """
+        rows = self.conn.execute(
+            """
+            select identifier, hash from documents where (
+                package=?
+            AND version=?
+            AND category=?
+            AND hash is not NULL)
+            """,
+            (module, version, kind),
+        )
+        return dict(rows)
+
+    def _get(self, key: Key) -> Union[bytes, memoryview]:
+        assert isinstance(key, Key)
+        return self._blobs.get(self._blob_parts(key))
+
+    def _get_backrefs(self, key: Key) -> Set[Key]:
+        return self.get_backrefs([key])[key]
+
+    def get_backrefs(self, keys: Iterable[Key]) -> Dict[Key, Set[Key]]:
+        """
+        Bulk version of `get_backref`.
+
+        Get the back references of all the given keys with a single query.
+        Destinations with a ``*`` version (references we could not pin to a
+        version at gen time) are considered to point to all the versions.
+
+        Parameters
+        ----------
+        keys : iterable of Key
+
+        Returns
+        -------
+        backrefs : dict
+            Mapping from each of the requested keys to the set of keys of the
+            documents referencing it.
+        """
+        keys = set(keys)
+        res: Dict[Key, Set[Key]] = {k: set() for k in keys}
+        if not keys:
+            return res
+        # filling the temporary table opens a transaction, make sure we do
+        # not keep it open when not in a batch.
+        with self._transaction():
+            cur = self._fill_wanted(keys)
+            backrows = cur.execute(
+                """
+            select wanted.*, documents.package, documents.version,
+                   documents.category, documents.identifier
+            from wanted
+                inner join destinations on (
+                        destinations.package=wanted.package
+                    AND destinations.version in (wanted.version, '*')
+                    AND destinations.category=wanted.category
+                    AND destinations.identifier=wanted.identifier)
+                inner join links on links.dest=destinations.id
+                inner join documents on links.source=documents.id
+            """
+            )
+            for row in backrows:
+                res[Key(*row[:4])].add(Key(*row[4:]))
+        return res
 
     def get_forwardrefs(self, key: Key) -> Set[Key]:
         cur = self.conn.cursor()
@@ -267,8 +854,12 @@ class GraphStore:
         from links
             inner join documents on links.source=documents.id
             inner join destinations on links.dest=destinations.id
-        where documents.identifier=?""",
-                (key.path,),
+        where (
+            documents.package=?
+        AND documents.version=?
+        AND documents.category=?
+        AND documents.identifier=?)""",
+                list(key),
             )
         )
 
@@ -284,40 +875,63 @@ class GraphStore:
     def get_backref(self, key: Key) -> Set[Key]:
         return self._get_backrefs(key)
 
-    def get(self, key: Key) -> bytes:
+    def get(self, key: Key) -> Union[bytes, memoryview]:
+        """
+        Get the content of a document.
+
+        This may be a memoryview over a memory mapped file to avoid copies;
+        `encoder.decode` accepts it directly, use ``bytes(...)`` if an actual
+        bytes object is needed.
+        """
         return self._get(key)
 
-    def _maybe_insert_source(self, key):
-        with self.conn:
-            c1 = self.conn.cursor()
-            rows = list(
-                c1.execute(
-                    """
+    def get_decoded(self, key: Key, decode: Callable[[Any], Any]):
+        """
+        Get a document, decoded with `decode`, going through `cache`.
+
+        The returned object is shared with other callers, do not mutate it.
+        """
+        assert isinstance(key, Key)
+        return self.cache.get(key, lambda: self._get(key), decode)
+
+    def _source_id(self, key: Key) -> Optional[int]:
+        rows = list(
+            self.conn.execute(
+                """
                 select id from documents where (
                     package=?
                 AND version=?
                 AND category=?
                 AND identifier=?)
                 """,
-                    list(key),
-                )
+                list(key),
             )
-            if not rows:
+        )
+        if not rows:
+            return None
+        [(source_id,)] = rows
+        return source_id
+
+    def _maybe_insert_source(self, key):
+        with self._transaction():
+            c1 = self.conn.cursor()
+            source_id = self._source_id(key)
+            if source_id is None:
                 c1.execute(
                     """
-                    insert into documents values
-                    (Null, ?, ?, ?, ?)
+                    insert into documents(package, version, category, identifier)
+                    values (?, ?, ?, ?)
                     """,
                     list(key),
                 )
                 source_id = c1.lastrowid
-            else:
-                [(source_id,)] = rows
+                if key.kind == "module":
+                    self._bump_generation()
 
         return source_id
 
     def _maybe_insert_dest(self, ref):
-        with self.conn:
+        with self._transaction():
             c1 = self.conn.cursor()
             rows = list(
                 c1.execute(
@@ -345,77 +959,313 @@ class GraphStore:
 
         return dest_id
 
-    def _meta_path(self, module: str, version: str):
+    def _fill_wanted(self, keys: Iterable[Tuple]) -> sqlite3.Cursor:
+        """
+        Fill the ``wanted`` temporary table with `keys`, in order to do
+        set-based queries by joining on it.
+        """
+        c1 = self.conn.cursor()
+        c1.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS wanted(
+            package TEXT NOT NULL,
+            version TEXT NOT NULL,
+            category TEXT NOT NULL,
+            identifier TEXT NOT NULL)
+            """
+        )
+        c1.execute("delete from wanted")
+        c1.executemany("insert into wanted values (?, ?, ?, ?)", keys)
+        return c1
+
+    def _destination_ids(self, refs: Iterable[Key]) -> Dict[Key, int]:
+        """
+        Set based version of `_maybe_insert_dest`.
+
+        Insert all the missing destinations at once, and get the id of all the
+        requested ones with a single join against a temporary table, instead
+        of one select (and maybe one insert) per reference.
+        """
+        values = [tuple(r) for r in refs]
+        if not values:
+            return {}
+        c1 = self.conn.cursor()
+        c1.executemany(
+            "insert or ignore into destinations values (NULL, ?, ?, ?, ?)", values
+        )
+        self._fill_wanted(values)
+        rows = c1.execute(
+            """
+            select destinations.*
+            from wanted
+                inner join destinations using (package, version, category, identifier)
+            """
+        )
+        return {Key(*r[1:]): r[0] for r in rows}
+
+    def _meta_parts(self, module: str, version: str):
         assert isinstance(module, str)
         assert isinstance(version, str)
-        return self._root / module / version / "meta.cbor"
+        return (module, version, "meta.cbor")
+
+    def _meta_key(self, module: str, version: str) -> Key:
+        return Key(module, version, "meta", "meta.cbor")
 
     def put_meta(self, module: str, version: str, data: bytes) -> None:
+        """
+        Store the metadata of a package; it is recorded like other documents,
+        under ``Key(module, version, "meta", "meta.cbor")``, with the hash of
+        its content.
+        """
         assert isinstance(data, bytes)
+        key = self._meta_key(module, version)
+        self.put(key, data, [], hashlib.sha256(data).hexdigest())
 
-        mp = self._meta_path(module, version)
-        mp.path.parent.mkdir(parents=True, exist_ok=True)
-
-        mp.write_bytes(data)
+    def get_meta(self, key: Key) -> Union[bytes, memoryview]:
+        return self._get(self._meta_key(key.module, key.version))
 
-    def get_meta(self, key: Key) -> bytes:
-        mp = self._meta_path(key.module, key.version)
-        return mp.read_bytes()
+    def get_meta_decoded(self, key: Key, decode: Callable[[Any], Any]):
+        """
+        Same as `get_decoded`, for the metadata of ``key``'s package.
+        """
+        return self.get_decoded(self._meta_key(key.module, key.version), decode)
 
-    def put(self, key: Key, bytes_: bytes, refs) -> None:
+    def put(
+        self, key: Key, bytes_: bytes, refs, source_hash: Optional[str] = None
+    ) -> None:
         """
         Store object ``bytes``, as path ``key`` with the corresponding
         links to other objects.
 
         refs : List[Key] ?
 
+        source_hash : str, optional
+            hash of what the document was made from, see `get_hash`. When not
+            given the previously stored one, if any, is kept. Ignored for
+            assets, which are hashed by content.
+
+        Assets are stored by content, putting an asset identical to one
+        already stored (typically the same figure in another version of a
+        library) does not write anything but the ``documents`` row.
         """
         assert isinstance(key, Key)
         for r in refs:
             assert isinstance(r, Key), r
-        path = self._key_to_path(key)
-        path.path.parent.mkdir(parents=True, exist_ok=True)
-
-        if "assets" not in key and path.exists():
+        parts = self._blob_parts(key)
+        if "assets" not in key and self._blobs.exists(parts):
             old_refs = self.get_forwardrefs(key)
         else:
             old_refs = set()
 
-        path.write_bytes(bytes_)
-
         new_refs = set(refs)
         del refs
 
         removed_refs = old_refs - new_refs
         added_refs = new_refs - old_refs
 
-        with self.conn:
+        digest: Optional[str]
+        old_digest: Optional[str]
+        if key.kind == "assets":
+            digest = hashlib.sha256(bytes_).hexdigest()
+            old_digest = self.get_hash(key)
+        else:
+            digest = old_digest = None
+
+        with self._transaction():
+            if digest is None:
+                self._blobs.put(parts, bytes_)
+            elif not self._blobs.exists(self._content_parts(digest)):
+                self._blobs.put(self._content_parts(digest), bytes_)
+            self.cache.invalidate(key)
             source_id = self._maybe_insert_source(key)
-            params = []
-            for ref in added_refs:
-                params.append((source_id, self._maybe_insert_dest(ref), "debug"))
-
-            to_del = []
-            for ref in removed_refs:
-                to_del.append((source_id, self._maybe_insert_dest(ref)))
+            if digest is not None:
+                self.conn.execute(
+                    "update documents set hash=? where id=?", (digest, source_id)
+                )
+                if old_digest is None and self._blobs.exists(key):
+                    # stored under its key before assets were deduplicated.
+                    self._blobs.remove(key)
+                elif old_digest not in (None, digest):
+                    self._release_content(old_digest)
+            elif source_hash is not None:
+                self.conn.execute(
+                    "update documents set hash=? where id=?", (source_hash, source_id)
+                )
+            dest_ids = self._destination_ids(added_refs | removed_refs)
+            params = [(source_id, dest_ids[ref], "debug") for ref in added_refs]
+            to_del = [(source_id, dest_ids[ref]) for ref in removed_refs]
             c3 = self.conn.cursor()
             c3.executemany("insert or ignore into links values (NULL, ?,?,?)", params)
             c3.executemany("delete from links where source=? and dest=? ", to_del)
 
-    def glob(self, pattern) -> List[Key]:
-        acc = ""
-        for p in pattern:
-            if p is None:
-                acc += "/*"
-            else:
-                acc += "/" + p
-        acc = acc[1:]
-        try:
-            res = [
-                self._path_to_key(p)
-                for p in self._root.glob(acc)
-                if not p.name.endswith(".br")
-            ]  # !!
-        except Exception as e:
-            raise type(e)("Acc:" + acc, pattern)
+    def put_many(self, items: Iterable[Tuple]) -> None:
+        """
+        Store many documents in a single transaction.
+
+        Parameters
+        ----------
+        items : iterable of (key, bytes, refs) or (key, bytes, refs, source_hash)
+            same as the arguments of `put`; can be a generator, documents are
+            written as they are consumed.
+
+        See Also
+        --------
+        put, batch
+        """
+        with self.batch():
+            for item in items:
+                self.put(*item)
+
+    def put_unresolved(self, key: Key, refs: Iterable[Tuple[str, str]]) -> None:
+        """
+        Record the references of `key` that could not be resolved, replacing
+        the ones previously recorded for it.
+
+        Parameters
+        ----------
+        key : Key
+        refs : iterable of (kind, name)
+            kind is a free-form string saying where the reference comes from,
+            like ``"see-also"``; `relink` tries to resolve those again.
+        """
+        source_id = self._source_id(key)
+        if source_id is None:
+            # not a stored document, there is nothing to relink.
+            return
+        with self._transaction():
+            self.conn.execute("delete from unresolved where source=?", (source_id,))
+            self.conn.executemany(
+                "insert or ignore into unresolved values (?, ?, ?)",
+                [(source_id, kind, name) for kind, name in refs],
+            )
+
+    def get_unresolved(
+        self,
+        package: Optional[str] = None,
+        version: Optional[str] = None,
+        *,
+        kind: Optional[str] = None,
+    ) -> Dict[Key, Set[str]]:
+        """
+        Unresolved names, by the key of the document referring to them.
+
+        This answers "what is still dangling in this package" without decoding
+        any document.
+
+        Parameters
+        ----------
+        package, version : str, optional
+            only consider the documents of this package / version.
+        kind : str, optional
+            only this kind of references, see `put_unresolved`.
+
+        See Also
+        --------
+        wanted_by
+        """
+        where = [
+            f"{column}=?"
+            for column, value in [
+                ("documents.package", package),
+                ("documents.version", version),
+                ("unresolved.kind", kind),
+            ]
+            if value is not None
+        ]
+        params = [v for v in [package, version, kind] if v is not None]
+        query = """
+            select documents.package, documents.version, documents.category,
+                   documents.identifier, unresolved.name
+            from unresolved
+                inner join documents on unresolved.source=documents.id
+            """
+        if where:
+            query += " where " + " AND ".join(where)
+        res: Dict[Key, Set[str]] = {}
+        for row in self.conn.execute(query, params):
+            res.setdefault(Key(*row[:4]), set()).add(row[4])
         return res
+
+    def wanted_by(self, name: str) -> Set[Key]:
+        """
+        Keys of the documents with an unresolved reference to `name`.
+        """
+        rows = self.conn.execute(
+            """
+            select distinct documents.package, documents.version,
+                   documents.category, documents.identifier
+            from unresolved
+                inner join documents on unresolved.source=documents.id
+            where unresolved.name=?
+            """,
+            (name,),
+        )
+        return {Key(*r) for r in rows}
+
+    def get_relinked_refs(self) -> Optional[Set[Key]]:
+        """
+        References that were known at the last relink, None if the store was
+        never relinked.
+        """
+        if self._get_setting("relinked") is None:
+            return None
+        return {Key(*r) for r in self.conn.execute("select * from relinked")}
+
+    def set_relinked_refs(self, refs: Iterable[Key]) -> None:
+        with self._transaction():
+            self.conn.execute("delete from relinked")
+            self.conn.executemany(
+                "insert into relinked values (?, ?, ?, ?)", [tuple(r) for r in refs]
+            )
+            self._set_setting("relinked", "1")
+
+    @overload
+    def glob(
+        self, pattern: Tuple[Optional[str], Optional[str]]
+    ) -> List[Tuple[str, str]]:
+        ...
+
+    @overload
+    def glob(
+        self,
+        pattern: Tuple[Optional[str], Optional[str], Optional[str], Optional[str]],
+    ) -> List[Key]:
+        ...
+
+    @overload
+    def glob(self, pattern: Sequence[Optional[str]]) -> List[Any]:
+        ...
+
+    def glob(self, pattern):
+        """
+        List the keys of all the stored documents matching `pattern`.
+
+        Parameters
+        ----------
+        pattern : tuple
+            either a 4-items (module, version, kind, path) or 2-items (module,
+            version) pattern, where ``None`` matches any value.
+
+        Returns
+        -------
+        list of Key for 4-items patterns, list of distinct (module, version)
+        tuples for 2-items patterns.
+
+        Notes
+        -----
+        This is a query on the ``documents`` table, which has a row for every
+        `put`, we do not touch the filesystem.
+        """
+        columns = ["package", "version", "category", "identifier"]
+        assert len(pattern) in (2, 4), pattern
+        columns = columns[: len(pattern)]
+        where = [f"{c}=?" for c, p in zip(columns, pattern) if p is not None]
+        params = [p for p in pattern if p is not None]
+
+        query = f"select distinct {', '.join(columns)} from documents"
+        if where:
+            query += " where " + " AND ".join(where)
+        rows = self.conn.cursor().execute(query, params)
+        if len(pattern) == 4:
+            return [Key(*r) for r in rows]
+        return [tuple(r) for r in rows]
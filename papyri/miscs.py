@@ -3,12 +3,30 @@ Misc helper functions
 """
 
 import io
+import multiprocessing
+import os
 import sys
 import ast
+import traceback
 
 from rich.progress import Progress
 
 from contextlib import redirect_stdout, redirect_stderr, contextmanager
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Dict, List, Optional, Tuple
+
+from .errors import (
+    ExecutionMemoryError,
+    ExecutionTimeoutError,
+    ExecutorCrashedError,
+    WorkerError,
+)
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None  # type: ignore
 
 
 @contextmanager
@@ -73,6 +91,11 @@ class BlockExecutor:
 
         return _pylab_helpers.Gcf.get_all_fig_managers()
 
+    def close_figs(self):
+        import matplotlib.pyplot as plt
+
+        plt.close("all")
+
     def get_figs(self):
         figs = []
         for fig_man in self.fig_man():
@@ -118,3 +141,264 @@ class BlockExecutor:
         stdout.seek(0)
         stderr.seek(0)
         return res, fig_managers, stdout.read(), stderr.read()
+
+
+# arguments common to all the tasks of a process pool, see `init_worker`.
+_worker_args: Optional[Tuple[Any, ...]] = None
+
+
+def init_worker(*args) -> None:
+    """
+    Process pool initializer, keeping `args` for `worker_args`.
+
+    Arguments common to all the tasks of a pool are this way sent once per
+    worker process, instead of once per task.
+
+    Examples
+    --------
+    >>> with multiprocessing.Pool(
+    ...     4, initializer=init_worker, initargs=(known_refs,)
+    ... ) as pool:  # doctest: +SKIP
+    ...     pool.map(task, items)
+
+    with ``task`` getting ``known_refs`` from ``worker_args()``.
+    """
+    global _worker_args
+    _worker_args = args
+
+
+def worker_args() -> Tuple[Any, ...]:
+    """
+    Arguments given to `init_worker` in this process.
+    """
+    assert _worker_args is not None, "not in a process started by init_worker"
+    return _worker_args
+
+
+@contextmanager
+def _memory_limit(mib: Optional[int]):
+    """
+    Limit the address space of the current process to grow by at most `mib`
+    MiB, on Linux only.
+    """
+    if mib is None or resource is None or not os.path.exists("/proc/self/statm"):
+        yield
+        return
+    with open("/proc/self/statm") as f:
+        used = int(f.read().split()[0]) * resource.getpagesize()
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = used + mib * 2**20
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def _sandbox_main(conn) -> None:
+    """
+    Loop of the sandbox process, runs the requests of a `Sandbox` on a
+    `BlockExecutor`, until the connection is closed.
+    """
+    import matplotlib.pyplot as plt
+
+    from .gen import obj_from_qualname
+
+    executor = BlockExecutor({})
+    while True:
+        try:
+            op, *args = conn.recv()
+        except EOFError:
+            return
+        status = "ok"
+        res: Any
+        try:
+            if op == "reset":
+                [ns_spec] = args
+                executor.close_figs()
+                executor = BlockExecutor(
+                    {k: obj_from_qualname(v) for k, v in ns_spec.items()}
+                )
+                res = None
+            elif op == "exec":
+                text, memory_limit = args
+                try:
+                    with _memory_limit(memory_limit):
+                        value, _, sout, serr = executor.exec(text)
+                except MemoryError:
+                    status = "memory"
+                    res = None
+                else:
+                    res = (None if value is None else repr(value), sout, serr)
+            elif op == "figs":
+                res = executor.get_figs()
+            elif op == "close_figs":
+                executor.close_figs()
+                res = None
+            else:
+                raise ValueError(op)
+        except Exception as e:
+            status = "error"
+            res = WorkerError(type(e).__name__, traceback.format_exc())
+        conn.send((status, res, plt.get_fignums()))
+
+
+class Sandbox:
+    """
+    Execute example code in a separate process.
+
+    The process has its own matplotlib state and namespaces, so a crashing or
+    hanging example does not take gen down with it: if it dies, or a request
+    takes longer than ``timeout`` seconds, it is killed, the request raises,
+    and a new process is started for the next request.
+
+    The process is spawned, not forked: gen runs threads (progress bars) by
+    the time it is (re)started, and a forked child could deadlock on locks
+    they hold. Namespaces are sent by name, and imported in the process.
+
+    Use `executor` to get a `BlockExecutor` like object running in the
+    sandbox.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        # default for requests that don't give one.
+        self.timeout = timeout
+        self.restarts = 0
+        self.fignums: List[int] = []
+        self._proc: Optional[BaseProcess] = None
+        self._conn: Optional[Connection] = None
+        self._pid: Optional[int] = None
+
+    def _start(self) -> Tuple[BaseProcess, Connection]:
+        if self._conn is not None:
+            # inherited from the process we were forked from.
+            self._conn.close()
+        ctx = multiprocessing.get_context("spawn")
+        conn, child = ctx.Pipe()
+        proc = ctx.Process(target=_sandbox_main, args=(child,), daemon=True)
+        proc.start()
+        child.close()
+        self._proc, self._conn = proc, conn
+        self._pid = os.getpid()
+        return proc, conn
+
+    def close(self) -> None:
+        proc, conn = self._proc, self._conn
+        # a forked copy of the sandbox must not touch the original process.
+        if proc is not None and conn is not None and self._pid == os.getpid():
+            conn.close()
+            proc.join(1)
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+        self._proc = self._conn = None
+        self.fignums = []
+
+    def _kill(self, proc: BaseProcess) -> None:
+        proc.kill()
+        proc.join()
+        self.close()
+        self.restarts += 1
+
+    def call(self, op: str, *args, timeout: Optional[float] = None):
+        if timeout is None:
+            timeout = self.timeout
+        if self._proc is None or self._conn is None or self._pid != os.getpid():
+            proc, conn = self._start()
+        else:
+            proc, conn = self._proc, self._conn
+        conn.send((op, *args))
+        if not conn.poll(timeout):
+            self._kill(proc)
+            raise ExecutionTimeoutError(f"{op} did not finish in {timeout}s")
+        try:
+            status, res, self.fignums = conn.recv()
+        except EOFError:
+            proc.join(1)
+            exitcode = proc.exitcode
+            self._kill(proc)
+            raise ExecutorCrashedError(
+                f"sandbox process died during {op}, exit code: {exitcode}"
+            ) from None
+        if status == "error":
+            raise res
+        if status == "memory":
+            raise ExecutionMemoryError(f"{op} went over the memory limit")
+        return res
+
+    def executor(
+        self,
+        ns_spec: Dict[str, str],
+        *,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+    ) -> "SandboxExecutor":
+        """
+        Parameters
+        ----------
+        ns_spec : dict
+            namespace to execute code in, with objects given by qualified
+            names, as understood by `obj_from_qualname`.
+        timeout : float, optional
+            wall-clock limit, in seconds, for executing one block.
+        memory_limit : int, optional
+            how much memory, in MiB, executing one block can allocate.
+        """
+        return SandboxExecutor(self, ns_spec, timeout, memory_limit)
+
+
+class SandboxExecutor:
+    """
+    Same interface as `BlockExecutor`, executing in a `Sandbox`.
+
+    Results of ``exec`` are the ``repr`` of the values, and figures are
+    figure numbers. If the sandbox is restarted, the namespace is reset
+    before the next block. ``exec`` raises `ExecutionTimeoutError` or
+    `ExecutionMemoryError` when a block goes over the limits.
+    """
+
+    def __init__(
+        self,
+        sandbox: Sandbox,
+        ns_spec: Dict[str, str],
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+    ):
+        self.sandbox = sandbox
+        self.ns_spec = ns_spec
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._restarts: Optional[int] = None
+
+    def _reset(self) -> None:
+        self._restarts = self.sandbox.restarts
+        self.sandbox.call("reset", self.ns_spec)
+
+    def __enter__(self):
+        self._reset()
+        assert (len(self.fig_man())) == 0, f"init fail in {len(self.fig_man())}"
+
+    def __exit__(self, *args, **kwargs):
+        if self._restarts == self.sandbox.restarts:
+            self.close_figs()
+
+    def fig_man(self) -> List[int]:
+        if self._restarts != self.sandbox.restarts:
+            return []
+        return self.sandbox.fignums
+
+    def close_figs(self):
+        self.sandbox.call("close_figs")
+
+    def get_figs(self) -> List[bytes]:
+        return self.sandbox.call("figs")
+
+    def exec(self, text):
+        if self._restarts != self.sandbox.restarts:
+            self._reset()
+        res, sout, serr = self.sandbox.call(
+            "exec", text, self.memory_limit, timeout=self.timeout
+        )
+        return res, self.fig_man(), sout, serr
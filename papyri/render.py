@@ -1,6 +1,7 @@
 import builtins
 import json
 import logging
+import mimetypes
 import operator
 import os
 import random
@@ -25,7 +26,7 @@ from .crosslink import IngestedBlobs, RefInfo, find_all_refs
 from .graphstore import GraphStore, Key
 from .take2 import RefInfo, encoder, Section
 from .utils import progress, dummy_progress
-from .tree import TreeVisitor
+from .tree import TreeVisitor, resolver_cache
 from . import take2
 
 FORMAT = "%(message)s"
@@ -245,9 +246,10 @@ def compute_graph(
     # all_nodes = set(Key(*k) for k in all_nodes)
 
     raw_edges = []
+    all_backrefs = gs.get_backrefs(all_nodes)
     for k in set(all_nodes):
         name = tuple(k)[3]
-        neighbors_refs = gs.get_backref(k)
+        neighbors_refs = all_backrefs[k]
         weights[name] = len(neighbors_refs)
         orig = [x[3] for x in neighbors_refs]
         all_nodes = all_nodes.union(neighbors_refs)
@@ -341,7 +343,7 @@ class HtmlRenderer:
         keys = self.store.glob((None, None, "meta", "aliases.cbor"))
         data = []
         for k in keys:
-            meta = encoder.decode(self.store.get_meta(k))
+            meta = self.store.get_meta_decoded(k, encoder.decode)
             data.append((k.module, k.version, meta["logo"]))
 
         return self.env.get_template("index.tpl.j2").render(data=data)
@@ -360,9 +362,8 @@ class HtmlRenderer:
         for it in items:
             if it.kind in ("assets", "examples", "meta"):
                 continue
-            data = self.store.get(it)
             try:
-                obj = encoder.decode(data)
+                obj = self.store.get_decoded(it, encoder.decode)
             except Exception:
                 print("Decode exception", it)
                 continue
@@ -428,20 +429,19 @@ class HtmlRenderer:
         figmap = defaultdict(lambda: [])
         assert isinstance(self.store, GraphStore)
         if package is not None:
-            meta = encoder.decode(
-                self.store.get_meta(Key(package, version, None, None))
+            meta = self.store.get_meta_decoded(
+                Key(package, version, None, None), encoder.decode
             )
         else:
             meta = {"logo": None}
         logo = meta["logo"]
         res = self.store.glob((package, version, "assets", None))
         backrefs = set()
-        for key in res:
-            brs = {tuple(x) for x in self.store.get_backref(key)}
-            backrefs = backrefs.union(brs)
+        for brs in self.store.get_backrefs(res).values():
+            backrefs = backrefs.union({tuple(x) for x in brs})
 
         for key in backrefs:
-            data = encoder.decode(self.store.get(Key(*key)))
+            data = self.store.get_decoded(Key(*key), encoder.decode)
             if "examples" in key:
                 continue
             # TODO: examples can actuallly be just Sections.
@@ -460,7 +460,7 @@ class HtmlRenderer:
 
         glist = self.store.glob((package, version, "examples", None))
         for target_key in glist:
-            section = encoder.decode(self.store.get(target_key))
+            section = self.store.get_decoded(target_key, encoder.decode)
 
             for k in [
                 u.value for u in section.children if u.__class__.__name__ == "Fig"
@@ -498,13 +498,14 @@ class HtmlRenderer:
     async def _get_toc_for(self, package, version):
         keys = self.store.glob((package, version, "meta", "toc.cbor"))
         assert len(keys) == 1
-        data = self.store.get(keys[0])
-        return encoder.decode(data)
+        return self.store.get_decoded(keys[0], encoder.decode)
 
     async def _list_narative(self, package: str, version: str, ext=""):
         toctrees = await self._get_toc_for(package, version)
 
-        meta = encoder.decode(self.store.get_meta(Key(package, version, None, None)))
+        meta = self.store.get_meta_decoded(
+            Key(package, version, None, None), encoder.decode
+        )
         logo = meta["logo"]
 
         class D:
@@ -529,9 +530,8 @@ class HtmlRenderer:
         """
         # return "Not Implemented"
         key = Key(package, version, "docs", ref)
-        bytes = self.store.get(key)
-        doc_blob = encoder.decode(bytes)
-        meta = encoder.decode(self.store.get_meta(key))
+        doc_blob = self.store.get_decoded(key, encoder.decode)
+        meta = self.store.get_meta_decoded(key, encoder.decode)
         # return "OK"
 
         template = self.env.get_template("html.tpl.j2")
@@ -574,13 +574,13 @@ class HtmlRenderer:
             toctrees=toctrees,
         )
 
-    async def _route_data(self, ref, version, known_refs):
+    async def _route_data(self, ref, version):
         root = ref.split("/")[0].split(".")[0]
         key = Key(root, version, "module", ref)
-        gbytes, backward, forward = self.store.get_all(key)
-        x_, y_ = find_all_refs(self.store)
-        doc_blob = encoder.decode(gbytes)
-        return x_, y_, doc_blob, backward, forward
+        doc_blob = self.store.get_decoded(key, encoder.decode)
+        backward = self.store.get_backref(key)
+        forward = self.store.get_forwardrefs(key)
+        return doc_blob, backward, forward
 
     async def _route(
         self,
@@ -593,16 +593,14 @@ class HtmlRenderer:
 
         template = self.env.get_template("html.tpl.j2")
         root = ref.split(".")[0]
-        meta = encoder.decode(self.store.get_meta(Key(root, version, None, None)))
+        meta = self.store.get_meta_decoded(
+            Key(root, version, None, None), encoder.decode
+        )
 
         known_refs, ref_map = find_all_refs(self.store)
 
         # technically incorrect we don't load backrefs
-        x_, y_, doc_blob, backward, forward = await self._route_data(
-            ref, version, known_refs
-        )
-        assert x_ == known_refs
-        assert y_ == ref_map
+        doc_blob, backward, forward = await self._route_data(ref, version)
         assert version is not None
 
         siblings = compute_siblings_II(ref, known_refs)  # type: ignore
@@ -673,7 +671,7 @@ class HtmlRenderer:
                 else:
                     data = {}
                 json_str = json.dumps(data)
-                meta = encoder.decode(self.store.get_meta(key))
+                meta = self.store.get_meta_decoded(key, encoder.decode)
                 data = render_one(
                     current_type="API",
                     template=template,
@@ -711,16 +709,33 @@ class HtmlRenderer:
         Copy assets from to their final destination.
 
         Assets are all the binary files that we don't want to change.
+
+        Assets with the same content (like the same figure across versions)
+        are written once, and hardlinked – or symlinked when the filesystem
+        does not support hardlinks – for the other versions.
         """
         if config.output_dir is None:
             return
 
+        written: Dict[str, Path] = {}
         assets_2 = self.store.glob((None, None, "assets", None))
         for _, asset in dummy_progress(assets_2, description="Copying assets"):
             b = config.output_dir / asset.module / asset.version / "img"
             b.mkdir(parents=True, exist_ok=True)
+            target = b / asset.path
+            digest = self.store.get_hash(asset)
+            if digest in written:
+                if target.exists() or target.is_symlink():
+                    target.unlink()
+                try:
+                    os.link(written[digest], target)
+                except OSError:
+                    target.symlink_to(os.path.relpath(written[digest], b))
+                continue
             data = self.store.get(asset)
-            (b / asset.path).write_bytes(data)
+            target.write_bytes(data)
+            if digest is not None:
+                written[digest] = target
 
     async def _write_example_files(self, config):
         if not config.html:
@@ -768,7 +783,9 @@ class HtmlRenderer:
 
     async def examples_handler(self, package, version, subpath):
 
-        meta = encoder.decode(self.store.get_meta(Key(package, version, None, None)))
+        meta = self.store.get_meta_decoded(
+            Key(package, version, None, None), encoder.decode
+        )
 
         pap_keys = self.store.glob((None, None, "meta", "aliases.cbor"))
         parts = {package: []}
@@ -776,9 +793,9 @@ class HtmlRenderer:
             mod, ver, _, _ = pk
             parts[package].append((RefInfo(mod, ver, "api", mod), mod))
 
-        bytes_ = self.store.get(Key(package, version, "examples", subpath))
-
-        ex = encoder.decode(bytes_)
+        ex = self.store.get_decoded(
+            Key(package, version, "examples", subpath), encoder.decode
+        )
         assert isinstance(ex, Section)
 
         class Doc:
@@ -798,10 +815,17 @@ class HtmlRenderer:
             ex=ex,
         )
 
+    async def img(self, package, version, subpath=None) -> Response:
+        data = self.store.get(Key(package, version, "assets", subpath))
+        mimetype, _ = mimetypes.guess_type(subpath)
+        return Response(bytes(data), mimetype=mimetype or "application/octet-stream")
+
     async def render_single_examples(self, module, version, *, ext, data):
 
         mod_vers = self.store.glob((None, None))
-        meta = encoder.decode(self.store.get_meta(Key(module, version, None, None)))
+        meta = self.store.get_meta_decoded(
+            Key(module, version, None, None), encoder.decode
+        )
         logo = meta["logo"]
         parts = {module: []}
         for mod, ver in mod_vers:
@@ -829,11 +853,6 @@ class HtmlRenderer:
         )
 
 
-async def img(package, version, subpath=None) -> Response:
-    folder = ingest_dir / package / version / "assets"
-    return await send_from_directory(folder, subpath)
-
-
 def static(name) -> Callable[[], bytes]:
     here = Path(os.path.dirname(__file__))
     static = here / "static"
@@ -875,6 +894,9 @@ def serve(*, sidebar: bool, port=1234):
     async def gr():
         return await html_renderer.gallery("*", "*")
 
+    async def caches():
+        return {"documents": gstore.cache.stats(), "resolver": resolver_cache.stats()}
+
     app.route("/logo.png")(static("papyri-logo.png"))
     app.route("/favicon.ico")(static("favicon.ico"))
     app.route("/papyri.css")(static("papyri.css"))
@@ -882,7 +904,7 @@ def serve(*, sidebar: bool, port=1234):
     app.route("/graph_canvas.js")(static("graph_canvas.js"))
     app.route("/graph_svg.js")(static("graph_svg.js"))
     # sub here is likely incorrect
-    app.route(f"{prefix}<package>/<version>/img/<path:subpath>")(img)
+    app.route(f"{prefix}<package>/<version>/img/<path:subpath>")(html_renderer.img)
     app.route(f"{prefix}<package>/<version>/examples/<path:subpath>")(
         html_renderer.examples_handler
     )
@@ -898,6 +920,7 @@ def serve(*, sidebar: bool, port=1234):
     app.route(f"{prefix}/gallery/<module>")(g)
     app.route(f"{prefix}/virtual/<module>/<node>")(html_renderer.virtual)
     app.route("/")(html_renderer.index)
+    app.route("/_debug/caches")(caches)
     port = int(os.environ.get("PORT", port))
     print("Seen config port ", port)
     prod = os.environ.get("PROD", None)
@@ -1027,8 +1050,8 @@ async def _ascii_render(key: Key, store: GraphStore, known_refs=None, template=N
 
     env, template = _ascii_env()
 
-    doc_blob = encoder.decode(store.get(key))
-    meta = encoder.decode(store.get_meta(key))
+    doc_blob = store.get_decoded(key, encoder.decode)
+    meta = store.get_meta_decoded(key, encoder.decode)
 
     # exercise the reprs
     assert str(doc_blob)
@@ -1099,8 +1122,9 @@ async def loc(document: Key, *, store: GraphStore, tree, known_refs, ref_map):
     """
     assert isinstance(document, Key), type(document)
     qa = document.path
-    bytes_, backward, forward = store.get_all(document)
-    doc_blob: IngestedBlobs = encoder.decode(bytes_)
+    doc_blob: IngestedBlobs = store.get_decoded(document, encoder.decode)
+    backward = store.get_backref(document)
+    forward = store.get_forwardrefs(document)
 
     siblings = cs2(qa, tree, ref_map)
 
@@ -1191,3 +1215,5 @@ async def main(ascii: bool, html, dry_run, sidebar: bool, graph: bool, minify: b
         config,
         graph,
     )
+    log.info("document cache: %s", gstore.cache.stats())
+    log.info("resolver cache: %s", resolver_cache.stats())
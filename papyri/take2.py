@@ -57,6 +57,7 @@ Unless your use case is widely adopted it is likely not worse the complexity
 
 from __future__ import annotations
 
+import io
 import json
 import sys
 import typing
@@ -1067,7 +1068,31 @@ def parse_rst_section(text):
     raise ValueError("Multiple sections present")
 
 
+class _BufferReader(io.RawIOBase):
+    """
+    Read only raw file over any buffer (memoryview, mmap...), to decode it
+    without first copying it whole into a `bytes` or `BytesIO`.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        pos = self._pos
+        n = min(len(b), len(self._view) - pos)
+        b[:n] = self._view[pos : pos + n]
+        self._pos = pos + n
+        return n
+
+
 class Encoder:
+    # below this size copying the buffer is cheaper than reading it in chunks.
+    _ZERO_COPY_MIN_SIZE = 16 * 1024
+
     def __init__(self, rev_map):
         self._rev_map = rev_map
 
@@ -1084,8 +1109,18 @@ class Encoder:
         kwds = {k: t for k, t in zip(tt, tag.value)}
         return type_(**kwds)
 
-    def decode(self, bytes):
-        return cbor2.loads(bytes, tag_hook=self._tag_hook)
+    def decode(self, data):
+        """
+        Decode CBOR `data`.
+
+        `data` can be `bytes` or any object supporting the buffer protocol,
+        like the memoryviews over mmaps returned by `GraphStore.get`. Large
+        buffers are decoded in chunks instead of being copied.
+        """
+        if isinstance(data, bytes) or len(data) < self._ZERO_COPY_MIN_SIZE:
+            return cbor2.loads(data, tag_hook=self._tag_hook)
+        reader = io.BufferedReader(_BufferReader(data))
+        return cbor2.CBORDecoder(reader, tag_hook=self._tag_hook).decode()
 
     def _available_tags(self):
         k = self._rev_map.keys()
@@ -0,0 +1,147 @@
+import io
+import sys
+import zipfile
+
+import pytest
+
+from papyri import crosslink
+from papyri.crosslink import Ingester, open_bundle
+from papyri.gen import Config, Gen
+from papyri.graphstore import Key
+
+
+@pytest.fixture
+def bundle(tmp_path, monkeypatch):
+    """
+    Bundle of a small generated package, f has a see also that cannot be
+    resolved.
+    """
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "xlink.py").write_text(
+        '__version__ = "0.1"\n\n\n'
+        'def f():\n    """\n    Summary.\n\n'
+        "    See Also\n    --------\n    g\n    missing\n"
+        '    """\n\n\n'
+        'def g():\n    """\n    Other summary.\n    """\n'
+    )
+    monkeypatch.syspath_prepend(str(src))
+    path = tmp_path / "xlink_0.1"
+    path.mkdir()
+    try:
+        g = Gen(dummy_progress=True, config=Config(infer=False, dummy_progress=True))
+        g.collect_package_metadata("xlink", relative_dir=tmp_path, meta={})
+        g.collect_api_docs("xlink")
+        g.write(path)
+    finally:
+        sys.modules.pop("xlink", None)
+    return path
+
+
+def _ingest(bundle, root, **kwargs):
+    root.mkdir()
+    ingester = Ingester(dp=True, root=root, **kwargs)
+    ingester.ingest(bundle, check=False)
+    return ingester.gstore
+
+
+def _dump(store):
+    """
+    Everything ingested in `store`.
+    """
+    return {
+        key: (bytes(store.get(key)), store.get_forwardrefs(key))
+        for key in store.glob((None, None, None, None))
+    }, store.get_unresolved()
+
+
+def test_open_bundle(tmp_path):
+    bundle = tmp_path / "mod_1.0"
+    (bundle / "module").mkdir(parents=True)
+    (bundle / "papyri.json").write_text("{}")
+    (bundle / "module" / "mod.json").write_text("{}")
+    with open_bundle(bundle) as root:
+        assert root == bundle
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.write(bundle / "papyri.json", "mod_1.0/papyri.json")
+        zf.write(bundle / "module" / "mod.json", "mod_1.0/module/mod.json")
+    (tmp_path / "mod_1.0.zip").write_bytes(buf.getvalue())
+
+    for source in [tmp_path / "mod_1.0.zip", buf]:
+        with open_bundle(source) as root:
+            assert root.name == "mod_1.0"
+            assert (root / "papyri.json").read_text() == "{}"
+            assert [p.name for p in (root / "module").iterdir()] == ["mod.json"]
+        # archives opened by open_bundle are closed.
+        assert root.root.fp is None
+
+    with zipfile.ZipFile(buf) as zf:
+        with open_bundle(zf) as root:
+            pass
+        assert zf.fp is not None
+
+
+def test_maybe_resolvable():
+    from papyri.crosslink import _maybe_resolvable
+    from papyri.graphstore import Key
+
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    c = Key("mod", "1.0", "module", "mod.c")
+    unresolved = {a: {"other.thing"}, b: {"~thing", "nope"}, c: {"np.stuff"}}
+    new_paths = {"other.thing", "numpy.stuff"}
+    rev_aliases = {"np.stuff": "numpy.stuff"}
+    assert _maybe_resolvable(unresolved, new_paths, rev_aliases) == [a, b, c]
+    assert _maybe_resolvable(unresolved, {"other.nope"}, {}) == [b]
+
+
+def test_reingest_skips_unchanged(bundle, tmp_path, monkeypatch):
+    store = _ingest(bundle, tmp_path / "store")
+    ingested = _dump(store)
+
+    processed = []
+    process = crosslink._process_api_file
+
+    def _process_api_file(qa, *args):
+        processed.append(qa)
+        return process(qa, *args)
+
+    monkeypatch.setattr(crosslink, "_process_api_file", _process_api_file)
+    ingester = Ingester(dp=True, root=tmp_path / "store")
+    ingester.ingest(bundle, check=False)
+    assert processed == []
+    assert _dump(ingester.gstore) == ingested
+
+    g = bundle / "module" / "xlink.g.json"
+    g.write_text(g.read_text().replace("Other summary", "Changed summary"))
+    ingester.ingest(bundle, check=False)
+    assert processed == ["xlink.g"]
+    assert b"Changed summary" in ingester.gstore.get(
+        Key("xlink", "0.1", "module", "xlink.g")
+    )
+
+
+def test_ingest_jobs(bundle, tmp_path):
+    serial = _dump(_ingest(bundle, tmp_path / "serial"))
+    assert len(serial[0]) == 5
+    assert _dump(_ingest(bundle, tmp_path / "pool", jobs=2)) == serial
+
+
+def test_ingest_zip(bundle, tmp_path):
+    archive = tmp_path / "xlink_0.1.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for path in bundle.rglob("*"):
+            zf.write(path, path.relative_to(bundle.parent))
+
+    expected = _dump(_ingest(bundle, tmp_path / "dir"))
+    assert _dump(_ingest(archive, tmp_path / "zip")) == expected
+
+
+def test_ingest_records_unresolved(bundle, tmp_path):
+    store = _ingest(bundle, tmp_path / "store")
+    f = Key("xlink", "0.1", "module", "xlink.f")
+    assert store.get_unresolved() == {f: {"missing"}}
+    assert store.get_unresolved(kind="see-also") == {f: {"missing"}}
+    assert store.wanted_by("missing") == {f}
@@ -66,3 +66,30 @@ def test_4():
 
     with ec("TestItem"):
         ShouldValueErrorTypeError()
+
+
+def test_replay_worker_errors():
+    from papyri.gen import _ErrorRecorder
+
+    c = Config()
+    c.expected_errors = {"ValueError": ["TestItem"]}
+    c.early_error = False
+    c.fail_unseen_error = True
+    ec = ErrorCollector(c, log)
+
+    rec = _ErrorRecorder()
+    with rec("TestItem"):
+        DoesValueError()
+    with rec("Other"):
+        ShouldValueErrorTypeError()
+    assert [(qa, e.ename) for qa, e in rec.outcomes] == [
+        ("TestItem", "ValueError"),
+        ("Other", "TypeError"),
+    ]
+
+    for qa, e in rec.outcomes:
+        with ec(qa):
+            raise e
+
+    assert ec._errors == {"TypeError": ["Other"]}
+    assert ec._expected_unseen == {}
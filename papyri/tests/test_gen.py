@@ -1,3 +1,5 @@
+import json
+import pytest
 from functools import lru_cache
 
 from papyri.gen import Config, Gen, NumpyDocString, BlockExecutor, APIObjectInfo
@@ -35,11 +37,16 @@ def test_find_beyond_decorators():
     assert doc.item_file.endswith("test_gen.py")
 
 
-def test_infer():
+def test_infer(tmp_path, monkeypatch):
+    import sys
     import scipy
     from scipy._lib._uarray._backend import Dispatchable
+    from papyri.cache import JediCache
     from papyri.gen import parse_script, Config
 
+    monkeypatch.setattr(
+        sys.modules["papyri.gen"], "jedi_cache", JediCache(tmp_path / "jedi.db")
+    )
     c = Config(infer=True)
     res = parse_script(
         "\nx = Dispatchable(1, str)\nx",
@@ -66,3 +73,366 @@ def test_infer():
     )
 
     assert list(res) == list(expected)
+
+
+def test_sandbox_timeout_and_crash():
+    from papyri.errors import ExecutionTimeoutError, ExecutorCrashedError
+    from papyri.miscs import Sandbox
+
+    sandbox = Sandbox(timeout=2)
+    executor = sandbox.executor({"np": "numpy", "plt": "matplotlib.pyplot"})
+    with executor:
+        res, figs, _, _ = executor.exec("x = np.arange(3)\nx")
+        assert res == "array([0, 1, 2])"
+        assert executor.exec("plt.plot([1, 2])")[1] == [1]
+        assert executor.get_figs()[0].startswith(b"\x89PNG")
+        with pytest.raises(ExecutionTimeoutError):
+            executor.exec("import time; time.sleep(10)")
+        with pytest.raises(ExecutorCrashedError):
+            executor.exec("import os; os._exit(1)")
+        # restarted, with a fresh namespace.
+        assert executor.exec("len(np.arange(2))")[0] == "2"
+    assert sandbox.restarts == 2
+    sandbox.close()
+
+
+def slow_example():
+    """
+    Examples
+    --------
+    >>> x = 1
+
+    >>> import time
+    ... time.sleep(10)
+
+    >>> x
+    1
+    """
+
+
+def test_exec_limits():
+    config = Config(
+        exec=True,
+        infer=False,
+        exec_timeout=60,
+        exec_limits={"papyri.tests": {"timeout": 2}, "papyri": {"timeout": 30}},
+    )
+    assert config.exec_limits_for("papyri.tests.test_gen.ex1") == (2, None)
+    assert config.exec_limits_for("papyri.gen") == (30, None)
+    assert config.exec_limits_for("numpy") == (60, None)
+    # prefixes match whole components.
+    assert config.exec_limits_for("papyri.testsuite") == (30, None)
+    assert config.exec_limits_for("papyri.tests") == (2, None)
+
+    gen = Gen(dummy_progress=True, config=config)
+    api_object = APIObjectInfo("function", slow_example.__doc__, None)
+    doc, figs = gen.prepare_doc_for_one_object(
+        slow_example,
+        NumpyDocString(slow_example.__doc__),
+        qa="papyri.tests.test_gen.slow_example",
+        config=config,
+        aliases=[],
+        api_object=api_object,
+    )
+    codes = [c for c in doc.example_section_data.children if type(c).__name__ == "Code"]
+    assert [c.ce_status for c in codes] == ["execed", "timeout", "compiled"]
+
+    # can't be imported in the sandbox, and is not executed without limits.
+    def local():
+        pass
+
+    doc, figs = gen.prepare_doc_for_one_object(
+        local,
+        NumpyDocString(slow_example.__doc__),
+        qa="papyri.tests.test_gen.local",
+        config=config,
+        aliases=[],
+        api_object=api_object,
+    )
+    codes = [c for c in doc.example_section_data.children if type(c).__name__ == "Code"]
+    assert [c.ce_status for c in codes] == ["compiled"] * 3
+
+
+def test_namespace_spec():
+    import numpy as np
+
+    from papyri.gen import _namespace_spec
+
+    ns = {"np": np, "sum": np.ndarray.sum, "pi": np.pi}
+    assert _namespace_spec(ns) is None
+    paths = {"sum": "numpy.ndarray.sum", "pi": "numpy.pi"}
+    assert _namespace_spec(ns, paths) == {
+        "np": "numpy",
+        "sum": "numpy:ndarray.sum",
+        "pi": "numpy:pi",
+    }
+
+
+def test_sandbox_memory_limit():
+    from papyri.errors import ExecutionMemoryError
+    from papyri.miscs import Sandbox
+
+    sandbox = Sandbox()
+    executor = sandbox.executor({}, memory_limit=64)
+    with executor:
+        with pytest.raises(ExecutionMemoryError):
+            executor.exec("x = bytearray(512 * 2**20)")
+        assert executor.exec("y = bytearray(2**20)\nlen(y)")[0] == "1048576"
+    sandbox.close()
+
+
+def test_jedi_cache(tmp_path):
+    from papyri.cache import JediCache
+
+    cache = JediCache(tmp_path / "jedi.db", max_size=40)
+    assert cache.get("x = 1") is None
+    cache.set("x = 1", [["x", "builtins.int"]])
+    assert cache.get("x = 1") == [("x", "builtins.int")]
+    assert cache.get("x = 1", infer=False) is None
+    cache.set("y = 1", [["y", "builtins.int"]])
+
+    # hits do not write their access time right away.
+    atimes = list(cache.conn.execute("SELECT key, atime FROM jedi"))
+    cache.get("x = 1")
+    assert list(cache.conn.execute("SELECT key, atime FROM jedi")) == atimes
+
+    # y is the least recently used.
+    assert cache.prune() == 1
+    assert cache.get("y = 1") is None
+    assert cache.get("x = 1") is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_jedi_session(tmp_path, monkeypatch):
+    import sys
+    from papyri.cache import JediCache
+    from papyri.gen import JediSession, parse_script
+
+    gen_module = sys.modules["papyri.gen"]
+    scripts = ["import os", "x = os.path.join('a', 'b')", "y = x.split()\ny", "x"]
+    session = JediSession("".join("\n" + s for s in scripts), {})
+    config = Config(infer=True)
+    results = {}
+    for s in [None, session]:
+        monkeypatch.setattr(gen_module, "jedi_cache", JediCache(tmp_path / f"{s}.db"))
+        prev = ""
+        results[s] = []
+        for script in scripts:
+            results[s].append(parse_script(script, {}, prev, config, session=s))
+            prev += "\n" + script
+    assert results[session] == results[None]
+    assert ("x", "builtins.str") in results[session][-1]
+
+
+def test_dfs_collector():
+    from types import ModuleType
+
+    from papyri.gen import DFSCollector
+
+    root = ModuleType("synth")
+    sub = ModuleType("synth.sub")
+    root.sub = sub
+
+    def f():
+        pass
+
+    f.__module__ = "synth.sub"
+    f.__qualname__ = "f"
+    klass = type("K", (), {"f": f, "__module__": "synth.sub"})
+    sub.f = f
+    sub.K = klass
+    # reachable twice, and not part of the package.
+    root.alias = f
+    root.path = __import__("os").path
+
+    collector = DFSCollector(root, [sub])
+    items = collector.items()
+    assert items == {
+        "synth": root,
+        "synth.sub": sub,
+        "synth.sub.f": f,
+        "synth.sub.K": klass,
+    }
+    assert collector.aliases["synth.sub.f"] == ["synth.alias"]
+    assert collector.compute_aliases()[0] == {"synth.sub.f": "synth.alias"}
+
+
+def test_discover_submodules(tmp_path, monkeypatch):
+    import sys
+
+    from papyri.gen import DFSCollector, find_submodules
+
+    pkg = tmp_path / "discovered"
+    (pkg / "sub").mkdir(parents=True)
+    (pkg / "__init__.py").write_text("")
+    (pkg / "sub" / "__init__.py").write_text("")
+    (pkg / "sub" / "mod.py").write_text("def f():\n    pass\n")
+    (pkg / "_private.py").write_text("raise ImportError('private')")
+    (pkg / "excluded.py").write_text("raise ImportError('excluded')")
+    (pkg / "broken.py").write_text("raise ImportError('missing dependency')")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    names = find_submodules("discovered", ["discovered.excluded"])
+    assert names == [
+        "discovered.broken",
+        "discovered.sub",
+        "discovered.sub.mod",
+    ]
+    assert "discovered.sub" not in sys.modules
+
+    import discovered
+
+    try:
+        collector = DFSCollector(discovered, [], names)
+        items = collector.items()
+    finally:
+        for name in [n for n in sys.modules if n.startswith("discovered")]:
+            del sys.modules[name]
+    assert list(items) == [
+        "discovered",
+        "discovered.sub",
+        "discovered.sub.mod",
+        "discovered.sub.mod.f",
+    ]
+    assert set(collector.import_times) == {"discovered.sub", "discovered.sub.mod"}
+    assert list(collector.import_errors) == ["discovered.broken"]
+
+
+def test_incremental(tmp_path, monkeypatch):
+    import sys
+
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "incr.py").write_text(
+        '__version__ = "0.1"\n\n\ndef f():\n    """Summary."""\n'
+    )
+    monkeypatch.syspath_prepend(str(src))
+    bundle = tmp_path / "bundle"
+    bundle.mkdir()
+
+    processed = []
+    process = Gen._process_api_object
+
+    def _process_api_object(self, qa, *args):
+        processed.append(qa)
+        return process(self, qa, *args)
+
+    monkeypatch.setattr(Gen, "_process_api_object", _process_api_object)
+
+    def gen():
+        processed.clear()
+        config = Config(incremental=True, infer=False, dummy_progress=True)
+        g = Gen(dummy_progress=True, config=config)
+        g.collect_package_metadata("incr", relative_dir=tmp_path, meta={})
+        g.load_manifest(bundle)
+        g.collect_api_docs("incr")
+        g.clean(bundle)
+        g.write(bundle)
+        return (bundle / "module" / "incr.f.json").read_bytes()
+
+    try:
+        first = gen()
+        assert processed == ["incr", "incr.f"]
+        assert gen() == first
+        assert processed == []
+
+        del sys.modules["incr"]
+        (src / "incr.py").write_text(
+            (src / "incr.py").read_text().replace("Summary", "Changed")
+        )
+        assert b"Changed" in gen()
+        assert processed == ["incr", "incr.f"]
+    finally:
+        sys.modules.pop("incr", None)
+
+
+def test_incremental_links(tmp_path, monkeypatch):
+    import sys
+
+    pkg = tmp_path / "src" / "incr2"
+    pkg.mkdir(parents=True)
+    (pkg / "__init__.py").write_text('__version__ = "0.1"\nfrom . import a, b\n')
+    (pkg / "a.py").write_text(
+        'def f():\n    """\n    Summary.\n\n    See Also\n    --------\n    g\n    """\n'
+    )
+    (pkg / "b.py").write_text("")
+    monkeypatch.syspath_prepend(str(tmp_path / "src"))
+    bundle = tmp_path / "bundle"
+    bundle.mkdir()
+
+    processed = []
+    process = Gen._process_api_object
+
+    def _process_api_object(self, qa, *args):
+        processed.append(qa)
+        return process(self, qa, *args)
+
+    monkeypatch.setattr(Gen, "_process_api_object", _process_api_object)
+
+    def gen(source):
+        for name in [m for m in sys.modules if m.split(".")[0] == "incr2"]:
+            del sys.modules[name]
+        (pkg / "b.py").write_text(source)
+        processed.clear()
+        config = Config(incremental=True, infer=False, dummy_progress=True)
+        g = Gen(dummy_progress=True, config=config)
+        g.collect_package_metadata("incr2", relative_dir=tmp_path, meta={})
+        g.load_manifest(bundle)
+        g.collect_api_docs("incr2")
+        g.clean(bundle)
+        g.write(bundle)
+        return json.loads((bundle / "module" / "incr2.a.f.json").read_text())
+
+    try:
+        gen("")
+        # an unrelated object does not change what f links to.
+        gen('def h():\n    """Summary."""\n')
+        assert processed == ["incr2.b", "incr2.b.h"]
+        # but one named like its see also does.
+        blob = gen('def g():\n    """Summary."""\n')
+        assert sorted(processed) == ["incr2.a.f", "incr2.b", "incr2.b.g"]
+        [sa] = blob["see_also"]
+        assert sa["name"]["reference"]["path"] == "incr2.b.g"
+    finally:
+        for name in [m for m in sys.modules if m.split(".")[0] == "incr2"]:
+            del sys.modules[name]
+
+
+def test_jobs(tmp_path, monkeypatch):
+    import sys
+
+    from papyri.tree import import_cache
+
+    src = tmp_path / "src"
+    src.mkdir()
+    funcs = "".join(
+        f'\n\ndef f{i}(x):\n    """\n    Summary {i}, see f{i + 1}.\n\n'
+        f"    See Also\n    --------\n    os.path.join{i % 3}\n\n"
+        f'    Examples\n    --------\n    >>> f{i}(1)\n    """\n'
+        for i in range(10)
+    )
+    (src / "jobs.py").write_text('__version__ = "0.1"' + funcs)
+    monkeypatch.syspath_prepend(str(src))
+
+    def gen(jobs):
+        # workers start their own sandbox.
+        config = Config(infer=False, dummy_progress=True, exec=True, exec_sandbox=True)
+        g = Gen(dummy_progress=True, config=config)
+        g.collect_package_metadata("jobs", relative_dir=tmp_path, meta={})
+        import_cache.clear()
+        g.collect_api_docs("jobs", jobs=jobs)
+        # what workers import is sent back.
+        imports = dict(import_cache._solved)
+        return {qa: blob.to_json() for qa, blob in g.data.items()}, imports
+
+    imported = [f"os.path.join{i}" for i in range(3)]
+    try:
+        single = gen(1)
+        assert len(single[0]) == 11
+        assert single[1] == dict.fromkeys(imported)
+        assert gen(2) == single
+        # no fork, runs in a single process.
+        monkeypatch.setattr(sys, "platform", "win32")
+        assert gen(2) == single
+    finally:
+        sys.modules.pop("jobs", None)
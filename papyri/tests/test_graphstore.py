@@ -0,0 +1,254 @@
+import pytest
+
+from papyri.graphstore import GraphStore, Key
+
+
+def test_put_many_single_transaction(tmp_path):
+    store = GraphStore(tmp_path)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    c = Key("mod", "1.0", "module", "mod.c")
+
+    store.put_many([(a, b"a", [b, c]), (b, b"b", [c]), (c, b"c", [])])
+
+    assert store.get(a) == b"a"
+    assert store.get_forwardrefs(a) == {b, c}
+    assert store.get_backref(c) == {a, b}
+
+    # updating a document only updates its own links.
+    store.put_many([(a, b"a2", [b])])
+    assert store.get_forwardrefs(a) == {b}
+    assert store.get_backref(c) == {b}
+
+
+def test_batch_rollback(tmp_path):
+    store = GraphStore(tmp_path)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+
+    with pytest.raises(ValueError):
+        with store.batch():
+            store.put(a, b"a", [b])
+            raise ValueError
+
+    assert store.get_backref(b) == set()
+
+
+def test_refs_match_full_key(tmp_path):
+    store = GraphStore(tmp_path)
+    a1 = Key("mod", "1.0", "module", "mod.a")
+    a2 = Key("mod", "2.0", "module", "mod.a")
+    i1 = Key("mod", "1.0", "docs", "index")
+    i2 = Key("other", "1.0", "docs", "index")
+    anyv = Key("mod", "*", "module", "mod.a")
+    src = Key("other", "1.0", "module", "other.b")
+
+    store.put_many([(a1, b"", [i1]), (a2, b"", [i2]), (src, b"", [anyv])])
+
+    assert store.get_forwardrefs(a1) == {i1}
+    assert store.get_backref(i1) == {a1}
+    backrefs = store.get_backrefs([i1, i2, a1, a2])
+    assert backrefs == {i1: {a1}, i2: {a2}, a1: {src}, a2: {src}}
+
+
+def test_glob(tmp_path):
+    store = GraphStore(tmp_path)
+    a = Key("mod", "1.0", "module", "mod.a")
+    img = Key("mod", "1.0", "assets", "fig.png")
+    meta = Key("mod", "1.0", "meta", "aliases.cbor")
+    other = Key("other", "2.0", "module", "other.b")
+    store.put_many([(a, b"", []), (img, b"", []), (meta, b"", []), (other, b"", [])])
+
+    assert sorted(store.glob((None, None, "module", None))) == [a, other]
+    assert set(store.glob(("mod", None, None, None))) == {a, img, meta}
+    assert store.glob((None, None, "meta", "aliases.cbor")) == [meta]
+    assert sorted(store.glob((None, None))) == [("mod", "1.0"), ("other", "2.0")]
+
+    store.remove(a)
+    assert store.glob((None, None, "module", None)) == [other]
+
+    store.put_meta("mod", "1.0", b"data")
+    [meta_key] = store.glob(("mod", "1.0", "meta", "meta.cbor"))
+    assert store.get_meta(meta_key) == b"data"
+    assert store.get_hash(meta_key) is not None
+    store.remove(meta_key)
+    assert store.glob(("mod", "1.0", "meta", "meta.cbor")) == []
+    with pytest.raises(FileNotFoundError):
+        store.get_meta(meta_key)
+
+    # unresolved references of unknown documents are not recorded.
+    store.put_unresolved(Key("mod", "1.0", "module", "mod.c"), [("see-also", "x")])
+    assert store.glob((None, None, "module", None)) == [other]
+    assert store.get_unresolved() == {}
+
+
+@pytest.mark.parametrize("backend", ["files", "packed"])
+def test_backends_and_migrate(tmp_path, backend):
+    store = GraphStore(tmp_path, backend=backend)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    store.put_many([(a, b"a", [b]), (b, b"b", [])])
+    store.put(a, b"a2", [b])
+    store.put_meta("mod", "1.0", b"meta")
+
+    other = "packed" if backend == "files" else "files"
+    with pytest.raises(ValueError):
+        GraphStore(tmp_path, backend=other)
+
+    store.migrate(other)
+    assert store.backend == other
+    store = GraphStore(tmp_path)
+    assert store.backend == other
+    assert store.get(a) == b"a2"
+    assert store.get(b) == b"b"
+    assert store.get_meta(a) == b"meta"
+    assert store.get_backref(b) == {a}
+    if other == "packed":
+        assert not (tmp_path / "mod").exists()
+    else:
+        assert not (tmp_path / "blobs.pack").exists()
+
+
+@pytest.mark.parametrize("backend", ["files", "packed"])
+def test_large_blobs_are_memory_mapped(tmp_path, backend):
+    from papyri.take2 import Section, Paragraph, Words, encoder
+
+    store = GraphStore(tmp_path, backend=backend)
+    key = Key("mod", "1.0", "examples", "large")
+    section = Section([Paragraph([Words("x" * 100)])] * 500, "title")
+    data = encoder.encode(section)
+    store.put(key, data, [])
+
+    view = store.get(key)
+    assert isinstance(view, memoryview)
+    assert view == data
+    assert encoder.decode(view) == section
+
+    # overwriting the blob does not change what was mapped.
+    store.put(key, b"new", [])
+    assert view == data
+    assert store.get(key) == b"new"
+
+
+def test_decoded_cache(tmp_path):
+    store = GraphStore(tmp_path, cache_size=8)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    store.put_many([(a, b"aaaa", []), (b, b"bbbbbb", [])])
+
+    assert store.get_decoded(a, bytes) == b"aaaa"
+    assert store.get_decoded(a, bytes) is store.get_decoded(a, bytes)
+    assert store.cache.stats()["hits"] == 2
+    assert store.cache.stats()["misses"] == 1
+
+    store.put(a, b"AAAA", [])
+    assert store.get_decoded(a, bytes) == b"AAAA"
+
+    # does not fit with a, which is the least recently used.
+    store.get_decoded(b, bytes)
+    store.get_decoded(Key("mod", "1.0", "module", "mod.a"), bytes)
+    assert store.cache.stats()["misses"] == 4
+    assert store.cache.stats()["size"] == 4
+
+    store.remove(a)
+    with pytest.raises(FileNotFoundError):
+        store.get_decoded(a, bytes)
+
+
+@pytest.mark.parametrize("backend", ["files", "packed"])
+def test_assets_deduplicated(tmp_path, backend):
+    store = GraphStore(tmp_path, backend=backend)
+    a1 = Key("mod", "1.0", "assets", "fig.png")
+    a2 = Key("mod", "2.0", "assets", "fig.png")
+    store.put_many([(a1, b"png", []), (a2, b"png", [])])
+
+    assert store.get_hash(a1) == store.get_hash(a2)
+    content = store._content_parts(store.get_hash(a1))
+    assert store._blobs.exists(content)
+    if backend == "files":
+        assert not (tmp_path / "mod").exists()
+
+    store.remove(a1)
+    assert store.get(a2) == b"png"
+    store.put(a2, b"png2", [])
+    assert store.get(a2) == b"png2"
+    assert not store._blobs.exists(content)
+
+    store.migrate("packed" if backend == "files" else "files")
+    assert store.get(a2) == b"png2"
+
+
+def test_source_hashes(tmp_path):
+    store = GraphStore(tmp_path)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    store.put_many([(a, b"a", [], "h1"), (b, b"b", [])])
+    assert store.get_hashes("mod", "1.0", "module") == {"mod.a": "h1"}
+
+    # relinking does not know the source, and keeps the hash.
+    store.put(a, b"a2", [b])
+    assert store.get_hash(a) == "h1"
+    store.put(a, b"a3", [b], "h2")
+    assert store.get_hash(a) == "h2"
+
+
+def test_unresolved(tmp_path):
+    store = GraphStore(tmp_path)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    store.put_many([(a, b"a", []), (b, b"b", [])])
+    c = Key("other", "1.0", "module", "other.c")
+    store.put_many([(c, b"c", [])])
+    store.put_unresolved(a, [("see-also", "x"), ("missing", "y")])
+    store.put_unresolved(b, [("see-also", "x")])
+    store.put_unresolved(c, [("directive", "x")])
+    assert store.wanted_by("x") == {a, b, c}
+    store.put_unresolved(a, [("missing", "y")])
+    assert store.get_unresolved() == {a: {"y"}, b: {"x"}, c: {"x"}}
+    assert store.get_unresolved("other") == {c: {"x"}}
+    assert store.get_unresolved(kind="see-also") == {b: {"x"}}
+    store.remove(b)
+    assert store.wanted_by("x") == {c}
+
+    assert store.get_relinked_refs() is None
+    store.set_relinked_refs([a])
+    assert store.get_relinked_refs() == {a}
+
+
+def test_known_refs_snapshot(tmp_path):
+    store = GraphStore(tmp_path)
+    a = Key("mod", "1.0", "module", "mod.a")
+    b = Key("mod", "1.0", "module", "mod.b")
+    store.put(a, b"a", [])
+    refs, ref_map = store.known_refs()
+    assert {r.path for r in refs} == {"mod.a"}
+    assert ref_map["mod.a"].version == "1.0"
+
+    # same snapshot while the set of modules does not change.
+    store.put(a, b"a2", [])
+    store.put(Key("mod", "1.0", "examples", "ex"), b"", [])
+    assert store.known_refs()[0] is refs
+
+    store.put(b, b"b", [])
+    assert {r.path for r in store.known_refs()[0]} == {"mod.a", "mod.b"}
+    # other instances see the change.
+    other = GraphStore(tmp_path)
+    assert other.known_refs()[0] == store.known_refs()[0]
+    store.remove(b)
+    assert other.known_refs()[0] == refs
+
+    with pytest.raises(ValueError):
+        with store.batch():
+            store.put(b, b"b", [])
+            assert len(store.known_refs()[0]) == 2
+            raise ValueError
+    assert store.known_refs()[0] == refs
+
+    # the rolled back generation number is reused by the next change.
+    with pytest.raises(ValueError):
+        with store.batch():
+            store.put(b, b"b", [])
+            assert len(store.known_refs()[0]) == 2
+            raise ValueError
+    store.put(Key("mod", "1.0", "module", "mod.c"), b"c", [])
+    assert {r.path for r in store.known_refs()[0]} == {"mod.a", "mod.c"}
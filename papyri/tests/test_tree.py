@@ -0,0 +1,72 @@
+import pytest
+
+from papyri.take2 import RefInfo
+
+from papyri.tree import ResolverCache, ResolverIndex
+
+PATHS = [
+    "numpy",
+    "numpy.linspace",
+    "numpy.linalg",
+    "numpy.linalg.norm",
+    "numpy.ma.core.MaskedArray.mean",
+    "numpy.mean",
+    "numpydoc.docscrape",
+    "scipy.linalg.norm",
+    "scipy.linalg",
+]
+
+
+@pytest.mark.parametrize("root", ["numpy", "num", "scipy", "x"])
+@pytest.mark.parametrize(
+    "ref", ["norm", "linalg.norm", "mean", "a", "py", "MaskedArray.me", "zzz"]
+)
+def test_resolver_index_matches_scans(root, ref):
+    index = ResolverIndex(PATHS)
+    rooted = [p for p in PATHS if p.startswith(root)]
+    assert sorted(index.startswith(root)) == sorted(rooted)
+    assert sorted(index.containing(ref, root)) == sorted(
+        [p for p in rooted if ref in p]
+    )
+    assert sorted(index.endswith("." + ref)) == sorted(
+        [p for p in PATHS if p.endswith("." + ref)]
+    )
+
+
+def test_resolver_cache_bounded():
+    cache = ResolverCache(max_entries=2)
+    sets = [frozenset([RefInfo("mod", "1.0", "module", f"mod.f{i}")]) for i in range(3)]
+    first = cache.get(sets[0])
+    assert cache.get(frozenset(sets[0])) is first
+    assert "mod.f0" in first[0]
+    cache.get(sets[1])
+    cache.get(sets[2])
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "evictions": 1,
+        "entries": 2,
+        "paths": 2,
+    }
+    assert cache.get(sets[0]) is not first
+
+
+def test_import_cache():
+    from papyri.tree import ImportCache, _solve_import
+
+    calls = []
+
+    def solve(qa):
+        calls.append(qa)
+        return _solve_import(qa)
+
+    cache = ImportCache()
+    assert cache.get("papyri.tree.resolve_", solve) == "papyri.tree.resolve_"
+    assert cache.get("papyri.not_there", solve) is None
+    assert cache.get("papyri.not_there", solve) is None
+    assert calls == ["papyri.tree.resolve_", "papyri.not_there"]
+
+    # a new run imports again.
+    cache.clear()
+    assert cache.get("papyri.not_there", solve) is None
+    assert len(calls) == 3
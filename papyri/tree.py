@@ -5,10 +5,10 @@ usually trees, and update nodes.
 """
 
 import logging
+import threading
 
-from collections import Counter, defaultdict
-from functools import lru_cache
-from typing import Any, Dict, FrozenSet, List, Set, Tuple, Callable
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Callable
 
 from .take2 import (
     Admonition,
@@ -39,20 +39,88 @@ from .take2 import Section
 log = logging.getLogger("papyri")
 
 
-_cache: Dict[int, Tuple[Dict[str, RefInfo], FrozenSet[str]]] = {}
+class ResolverIndex:
+    """
+    Indices over the paths of all the known references, to answer the
+    queries `resolve_` does when a reference is not an exact path, without
+    scanning all the paths.
+
+    Paths are indexed by their first dotted component (for prefix queries),
+    by each of their dotted suffixes (for suffix queries), and, built on first
+    use, by trigrams for substring queries.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self.paths: List[str] = sorted(paths)
+        self._roots: Dict[str, List[str]] = defaultdict(list)
+        self._suffixes: Dict[str, List[str]] = defaultdict(list)
+        for path in self.paths:
+            parts = path.split(".")
+            self._roots[parts[0]].append(path)
+            for i in range(1, len(parts)):
+                self._suffixes[".".join(parts[i:])].append(path)
+        self._trigrams: Optional[Dict[str, List[int]]] = None
+
+    def startswith(self, prefix: str) -> List[str]:
+        """
+        Paths starting with `prefix`, which must not contain a dot.
+        """
+        assert "." not in prefix, prefix
+        return [
+            path
+            for root, paths in self._roots.items()
+            if root.startswith(prefix)
+            for path in paths
+        ]
+
+    def endswith(self, suffix: str) -> List[str]:
+        """
+        Paths ending with `suffix`, which must start with a dot.
+        """
+        assert suffix.startswith("."), suffix
+        return self._suffixes.get(suffix[1:], [])
+
+    def containing(self, sub: str, prefix: str) -> List[str]:
+        """
+        Paths starting with `prefix` (see `startswith`) and containing `sub`.
+        """
+        if len(sub) < 3:
+            return [p for p in self.startswith(prefix) if sub in p]
+        if self._trigrams is None:
+            trigrams: Dict[str, List[int]] = defaultdict(list)
+            for i, path in enumerate(self.paths):
+                for t in {path[j : j + 3] for j in range(len(path) - 2)}:
+                    trigrams[t].append(i)
+            self._trigrams = dict(trigrams)
+        postings = []
+        for j in range(len(sub) - 2):
+            if (posting := self._trigrams.get(sub[j : j + 3])) is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [
+            path
+            for path in (self.paths[i] for i in sorted(candidates))
+            if path.startswith(prefix) and sub in path
+        ]
 
 
 # @lru_cache(maxsize=100000)
 def _build_resolver_cache(
     known_refs: FrozenSet[RefInfo],
-) -> Tuple[Dict[str, RefInfo], FrozenSet[str]]:
+) -> Tuple[Dict[str, RefInfo], ResolverIndex]:
     """
     Build resolver cached.
 
     Here we build two caches:
 
     1) a mapping from fully qualified names to refinfo objects.
-    2) a set of all the keys we know about.
+    2) an index of all the keys we know about.
 
     Parameters
     ----------
@@ -63,8 +131,8 @@ def _build_resolver_cache(
     mapping:
         Mapping from path to a RefInfo, this allows to quickly compute
         what is the actual refinfo for a give path/qualname
-    keyset:
-        Frozenset of the map keys.
+    index:
+        ResolverIndex of the map keys.
 
     """
 
@@ -80,23 +148,63 @@ def _build_resolver_cache(
         assert len({c.module for c in cand}) == 1, cand
         _m2[kk] = cand[-1]
 
-    return _m2, frozenset(_m2.keys())
+    return _m2, ResolverIndex(_m2.keys())
 
 
-@lru_cache
-def root_start(root, refs):
-    """
-    Compute a subset of references that start with given root.
-    """
-    return frozenset(r for r in refs if r.startswith(root))
+_Resolver = Tuple[Dict[str, RefInfo], ResolverIndex]
 
 
-@lru_cache(10000)
-def endswith(end, refs):
+class ResolverCache:
     """
-    Compute as subset of references that ends with given root.
+    Bounded LRU cache of the resolver maps and indices built by
+    `_build_resolver_cache`, keyed by known refs set.
+
+    Known refs sets are compared by equality, so two sets with colliding
+    hashes never share a resolver; `GraphStore.known_refs` returns the same
+    object for a given generation, so lookups usually stop at an identity
+    check. Only the ``max_entries`` most recently used sets are kept alive,
+    which matters for long-running processes like ``papyri serve``, where
+    each ingest creates a new set.
     """
-    return frozenset(r for r in refs if r.endswith(end))
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[FrozenSet[RefInfo], _Resolver]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, known_refs: FrozenSet[RefInfo]) -> _Resolver:
+        with self._lock:
+            if known_refs in self._entries:
+                self._entries.move_to_end(known_refs)
+                self.hits += 1
+                return self._entries[known_refs]
+            self.misses += 1
+            entry = _build_resolver_cache(known_refs)
+            self._entries[known_refs] = entry
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                log.debug("evicted resolver for %s known refs", len(evicted))
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "paths": sum(len(m) for m, _ in self._entries.values()),
+        }
+
+
+resolver_cache = ResolverCache()
 
 
 class DelayedResolver:
@@ -164,7 +272,6 @@ def resolve_(
 
     # RefInfo(module, version, kind, path)
     # print('resolve', qa)
-    hk = hash(known_refs)
     hash(local_refs)
     assert rev_aliases is not None
     ref = Cannonical(ref)
@@ -178,20 +285,13 @@ def resolve_(
 
     assert isinstance(ref, str), ref
 
-    # TODO: LRU Cache seem to have speed problem here; and get slow while this should be just fine.
-    # this seem to be due to the fact that even if the hash is the same this still needs to compare the objects, as
-    # those may have been muted.
-    if hk not in _cache:
-        _cache[hk] = _build_resolver_cache(known_refs)
-
     # this is a mappign from the key to the most relevant
     # Refinfo to a document
     k_path_map: Dict[str, RefInfo]
 
-    # hashable for cachign /optimisation.
-    keyset: FrozenSet[str]
+    index: ResolverIndex
 
-    k_path_map, keyset = _cache[hk]
+    k_path_map, index = resolver_cache.get(known_refs)
 
     if ref.startswith("builtins."):
         return RefInfo(None, None, "missing", ref)
@@ -220,10 +320,9 @@ def resolve_(
                 return k_path_map[found]
             else:
                 root = qa.split(".")[0]
-                sub1 = root_start(root, keyset)
-                subset = endswith(ref, sub1)
+                subset = [q for q in index.endswith(ref) if q.startswith(root)]
                 if len(subset) == 1:
-                    return k_path_map[next(iter(subset))]
+                    return k_path_map[subset[0]]
                     # return RefInfo(None, None, "exists", next(iter(subset)))
                 else:
                     if len(subset) > 1:
@@ -241,8 +340,7 @@ def resolve_(
                 return k_path_map[attempt]
 
     q0 = qa.split(".")[0]
-    rs = root_start(q0, keyset)
-    attempts = [q for q in rs if (ref in q)]
+    attempts = index.containing(ref, q0)
     if len(attempts) == 1:
         # return RefInfo(None, None, "exists", attempts[0])
         return k_path_map[attempts[0]]
@@ -707,16 +805,8 @@ class DirectiveVisiter(TreeReplacer):
         )
 
     @classmethod
-    def _import_solver(cls, maybe_qa: str):
-        parts = maybe_qa.split(".")
-        are_id = [x.isidentifier() for x in parts]
-
-        if not all(are_id):
-            return None
-        else:
-            target_qa = full_qual(_obj_from_path(parts))
-            if target_qa is not None:
-                return target_qa
+    def _import_solver(cls, maybe_qa: str) -> Optional[str]:
+        return import_cache.get(maybe_qa, _solve_import)
 
     def replace_Directive(self, directive: Directive):
         domain, role = directive.domain, directive.role
@@ -830,6 +920,66 @@ class DirectiveVisiter(TreeReplacer):
         return [directive]
 
 
+def _solve_import(maybe_qa: str) -> Optional[str]:
+    parts = maybe_qa.split(".")
+    are_id = [x.isidentifier() for x in parts]
+
+    if not all(are_id):
+        return None
+    else:
+        return full_qual(_obj_from_path(parts))
+
+
+class ImportCache:
+    """
+    Memoized results of `DirectiveVisiter._import_solver`, including the
+    dotted paths that could not be imported, so that a reference repeated
+    across many docstrings is only imported and walked once.
+
+    Importing is only deterministic within a gen run: with editable installs
+    the code can change without the package version changing, and a cached
+    failure would hide a newly added object. The cache is not persisted, and
+    gen `clear` it at the start of each run. Worker processes of the run
+    send the results they add back to the parent with `take_new`, for it to
+    `update` its own cache.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._solved: Dict[str, Optional[str]] = {}
+        # added since the last `take_new`.
+        self._new: Dict[str, Optional[str]] = {}
+
+    def get(self, maybe_qa: str, solve: Callable[[str], Optional[str]]):
+        if maybe_qa in self._solved:
+            self.hits += 1
+            return self._solved[maybe_qa]
+        self.misses += 1
+        res = self._solved[maybe_qa] = self._new[maybe_qa] = solve(maybe_qa)
+        return res
+
+    def take_new(self) -> Dict[str, Optional[str]]:
+        """
+        The results added since the last call.
+        """
+        new, self._new = self._new, {}
+        return new
+
+    def update(self, solved: Dict[str, Optional[str]]) -> None:
+        self._solved.update(solved)
+
+    def clear(self) -> None:
+        self._solved.clear()
+        self._new.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._solved)}
+
+
+import_cache = ImportCache()
+
+
 def _import_max(parts):
 
     p = parts[0]